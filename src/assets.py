@@ -0,0 +1,91 @@
+import hashlib
+import io
+import os
+import threading
+from typing import AnyStr
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+# resolution the logo is resampled to, enough for print at its rendered size
+LOGO_DPI = 200
+
+CM_PER_INCH = 2.54
+
+
+class AssetCache:
+
+    def __init__(self, dpi: int = LOGO_DPI):
+        """
+        Cache of images prepared for embedding at a fixed width.
+        Images are read once, downsampled to the pixel width needed at the target dpi and cached by
+        content hash, so every document embeds the same small image instead of the original file.
+        Without Pillow the original bytes are cached and embedded as is.
+        Args:
+            dpi (int, optional): Target resolution of the embedded image. Defaults to LOGO_DPI.
+        """
+
+        self.dpi = dpi
+        self.hashes = {}
+        self.images = {}
+        self.lock = threading.Lock()
+
+
+    def __read(self, path: AnyStr):
+        stat = os.stat(path)
+        file_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+        if file_key not in self.hashes:
+            with open(path, 'rb') as f:
+                blob = f.read()
+            self.hashes[file_key] = (hashlib.sha256(blob).hexdigest(), blob)
+
+        return self.hashes[file_key]
+
+
+    def __downsample(self, blob: bytes, width_px: int) -> bytes:
+        if Image is None:
+            return blob
+
+        with Image.open(io.BytesIO(blob)) as img:
+            if img.width <= width_px:
+                return blob
+
+            height_px = max(1, round(img.height * width_px / img.width))
+            resized = img.resize((width_px, height_px), Image.LANCZOS)
+
+            stream = io.BytesIO()
+            resized.save(stream, format='PNG', optimize=True, dpi=(self.dpi, self.dpi))
+            scaled = stream.getvalue()
+
+        # a resampled png can end up larger than a well compressed original
+        return scaled if len(scaled) < len(blob) else blob
+
+
+    def get_image(self, path: AnyStr, width_cm: float) -> io.BytesIO:
+        """
+        Returns the image prepared for the given width, ready for add_picture.
+        Args:
+            path (AnyStr): Path to the original image.
+            width_cm (float): The width the image is rendered at, in cm.
+        Returns:
+            io.BytesIO: A stream over the prepared image.
+        """
+
+        width_px = round(width_cm / CM_PER_INCH * self.dpi)
+
+        with self.lock:
+            digest, blob = self.__read(path)
+            key = (digest, width_px)
+            if key not in self.images:
+                self.images[key] = self.__downsample(blob, width_px)
+            image = self.images[key]
+
+        return io.BytesIO(image)
+
+
+# one cache per process, shared by all helpers in that process
+assets = AssetCache()
@@ -5,14 +5,26 @@ from docx.enum.style import WD_STYLE_TYPE
 from docx.shared import Cm, Pt, RGBColor
 from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_BREAK
 from enumerations import BorderTemplate, InvoiceTemplate, DocumentType, OfferTemplate
-from typing import Dict
+from copy import deepcopy
+from docx.table import _Cell
+from typing import AnyStr, Dict, Iterable, List, Tuple
 import subprocess
 
+from assets import assets
+from pdf_converter import PdfConverter
+
+
+BORDER_HIDDEN = {"sz": 1, "val": "single", "color": "#FFFFFF", "space": "0"}
+BORDER_LINE = {"sz": 6, "val": "single", "color": "#000000", "space": "0"}
+
 
 class DocHelper:
 
-    def __init__(self):
-        pass
+    # tblBorders elements by border definition, built once per process
+    compiled_borders = {}
+
+    def __init__(self, converter: PdfConverter = None):
+        self.converter = converter
 
 
     def format_number(self, number: float, decimal_places: int = 2) -> str:
@@ -22,6 +34,24 @@ class DocHelper:
             return f"{number:,.1f}".replace(',','*').replace('.', ',').replace('*','.')
         elif decimal_places == 2:
             return f"{number:,.2f}".replace(',','*').replace('.', ',').replace('*','.')
+
+
+    def vat_lines(self, data: Dict) -> List[Tuple[AnyStr, float]]:
+        """
+        Returns the vat lines of the totals, one label and vat amount per rate, e.g. ('BTW 21%', 42.0).
+        Doc data without 'vat_rates' gets a single 'BTW' line with the vat of the invoice.
+        """
+
+        vat_rates = data.get("vat_rates")
+        if not vat_rates:
+            return [('BTW', data["invoice_vat_amt"])]
+
+        lines = []
+        # keys are the rates of the lines, e.g. 0.21, or their string form once the doc data went through json
+        for rate, amounts in sorted(vat_rates.items(), key=lambda rate_amounts: float(rate_amounts[0]), reverse=True):
+            pct = round(float(rate) * 100, 1)
+            lines.append((f'BTW {self.format_number(pct, 0 if pct == int(pct) else 1)}%', amounts["vat_amt"]))
+        return lines
     
 
     def set_cell_border(self, cell, **kwargs):
@@ -64,54 +94,84 @@ class DocHelper:
                         element.set(qn('w:{}'.format(key)), str(edge_data[key]))
 
 
+    def set_table_borders(self, table, **kwargs):
+        """
+        Set table`s borders, the default for every cell of the table, in one operation.
+        Usage: like set_cell_border, with the edges top, left, bottom, right, insideH and insideV.
+
+        set_table_borders(
+            table,
+            top={"sz": 6, "val": "single", "color": "#000000", "space": "0"},
+            insideH={"sz": 1, "val": "single", "color": "#FFFFFF", "space": "0"},
+        )
+        """
+        tblPr = table._tbl.tblPr
+
+        tblBorders = tblPr.find(qn('w:tblBorders'))
+        if tblBorders is not None:
+            tblPr.remove(tblBorders)
+
+        key = repr(sorted(kwargs.items()))
+        if key not in self.compiled_borders:
+            tblBorders = OxmlElement('w:tblBorders')
+            for edge in ('top', 'left', 'bottom', 'right', 'insideH', 'insideV'):
+                edge_data = kwargs.get(edge)
+                if edge_data:
+                    element = OxmlElement('w:{}'.format(edge))
+                    for attr in ["sz", "val", "color", "space", "shadow"]:
+                        if attr in edge_data:
+                            element.set(qn("w:{}".format(attr)), str(edge_data[attr]))
+                    tblBorders.append(element)
+            self.compiled_borders[key] = tblBorders
+
+        tblPr.insert_element_before(
+            deepcopy(self.compiled_borders[key]),
+            'w:shd', 'w:tblLayout', 'w:tblCellMar', 'w:tblLook', 'w:tblCaption', 'w:tblDescription', 'w:tblPrChange'
+        )
+
+
     def set_table_border_template(self, table, template: BorderTemplate):
         if template == BorderTemplate.NO_BORDERS:
             # Make table borders invisible
-            for row in table.rows:
-                for cell in row.cells:
+            self.set_table_borders(
+                table,
+                top=BORDER_HIDDEN, left=BORDER_HIDDEN, bottom=BORDER_HIDDEN, right=BORDER_HIDDEN,
+                insideH=BORDER_HIDDEN, insideV=BORDER_HIDDEN,
+            )
+        elif template == BorderTemplate.DETAIL_1:
+            # Invisible borders for the table, only the header and totals rows are lined
+            self.set_table_borders(
+                table,
+                top=BORDER_HIDDEN, left=BORDER_HIDDEN, bottom=BORDER_HIDDEN, right=BORDER_HIDDEN,
+                insideH=BORDER_HIDDEN, insideV=BORDER_HIDDEN,
+            )
+
+            for cell in table.rows[0].cells:
+                self.set_cell_border(
+                    cell,
+                    top=BORDER_LINE,
+                    bottom=BORDER_LINE,
+                    start=BORDER_HIDDEN,
+                    end=BORDER_HIDDEN,
+                )
+
+            if len(table.rows) > 1:
+                for cell in table.rows[-1].cells:
                     self.set_cell_border(
                         cell,
-                        top={"sz": 1, "val": "single", "color": "#FFFFFF", "space": "0"},
-                        bottom={"sz": 1, "val": "single", "color": "#FFFFFF", "space": "0"},
-                        start={"sz": 1, "val": "single", "color": "#FFFFFF", "space": "0"},
-                        end={"sz": 1, "val": "single", "color": "#FFFFFF", "space": "0"},
+                        top=BORDER_LINE,
+                        bottom=BORDER_HIDDEN,
+                        start=BORDER_HIDDEN,
+                        end=BORDER_HIDDEN,
                     )
-        elif template == BorderTemplate.DETAIL_1:
-            aantal_rijen = len(table.rows)
-            counter = 1
-            # Set borders for table
-            for row in table.rows:
-                if counter == 1:
-                    for cell in row.cells:
-                        self.set_cell_border(
-                            cell,
-                            top={"sz": 6, "val": "single", "color": "#000000", "space": "0"},
-                            bottom={"sz": 6, "val": "single", "color": "#000000", "space": "0"},
-                            start={"sz": 1, "val": "single", "color": "#FFFFFF", "space": "0"},
-                            end={"sz": 1, "val": "single", "color": "#FFFFFF", "space": "0"},
-                        )
-                elif counter != aantal_rijen:
-                    for cell in row.cells:
-                        self.set_cell_border(
-                            cell,
-                            top={"sz": 1, "val": "single", "color": "#FFFFFF", "space": "0"},
-                            bottom={"sz": 1, "val": "single", "color": "#FFFFFF", "space": "0"},
-                            start={"sz": 1, "val": "single", "color": "#FFFFFF", "space": "0"},
-                            end={"sz": 1, "val": "single", "color": "#FFFFFF", "space": "0"},
-                        )
-                else:
-                    for cell in row.cells:
-                        self.set_cell_border(
-                            cell,
-                            top={"sz": 6, "val": "single", "color": "#000000", "space": "0"},
-                            bottom={"sz": 1, "val": "single", "color": "#FFFFFF", "space": "0"},
-                            start={"sz": 1, "val": "single", "color": "#FFFFFF", "space": "0"},
-                            end={"sz": 1, "val": "single", "color": "#FFFFFF", "space": "0"},
-                        )
-                counter += 1
 
 
     def convert_to_pdf(self, docx_path, pdf_path):
+        if self.converter is not None:
+            # reuse the warm LibreOffice instances of the conversion service
+            self.converter.convert(docx_path, pdf_path)
+            return
+
         subprocess.run(['libreoffice', '--headless', '--convert-to', 'pdf', '--outdir', '/'.join(pdf_path.split('/')[:-1]), docx_path])
 
 
@@ -175,6 +235,14 @@ class DocHelper:
         
 
     def set_header(self, document: Document, data: Dict) -> None:
+        self.set_header_skeleton(document, data)
+        self.fill_header(document, data)
+
+
+    def set_header_skeleton(self, document: Document, data: Dict) -> None:
+        """
+        Builds the part of the header that does not depend on the invoice: the title and the logo.
+        """
         # Create a new header for the first section
         document.sections[0].different_first_page_header_footer = True
         header = document.sections[0].first_page_header
@@ -190,9 +258,18 @@ class DocHelper:
         bcell = rij0[1]
         ccell = rij0[2]
         image_cell = bcell.merge(ccell)
-        image_cell.paragraphs[0].add_run().add_picture(data["path_image"], width=Cm(7.5))
+        image_cell.paragraphs[0].add_run().add_picture(assets.get_image(data["path_image"], 7.5), width=Cm(7.5))
         image_cell.paragraphs[0].paragraph_format.alignment = WD_ALIGN_PARAGRAPH.RIGHT
 
+        self.set_table_border_template(hoofd, BorderTemplate.NO_BORDERS)
+
+
+    def fill_header(self, document: Document, data: Dict) -> None:
+        """
+        Fills the invoice details and the debtor address into a header built by set_header_skeleton.
+        """
+        hoofd = document.sections[0].first_page_header.tables[0]
+
         rij1 = hoofd.rows[1].cells
         details_cell = rij1[0]
         run = details_cell.paragraphs[0].add_run()
@@ -240,16 +317,54 @@ class DocHelper:
         run.add_break(WD_BREAK.LINE)
         run.add_text(f'{data["debtor_country"]}')
 
-        self.set_table_border_template(hoofd, BorderTemplate.NO_BORDERS)
+
+    def set_skeleton(self, document: Document, header: Dict, footer: Dict) -> None:
+        """
+        Applies everything that is shared by all documents of a creditor and template:
+        the styles, the margins, the title and logo of the header and the footers.
+        """
+        self.set_styles(document)
+        self.set_header_skeleton(document, header)
+        self.set_footer(document, footer)
+
+
+    def add_item_rows(self, table, template_row, items: Iterable[Dict], symbol: AnyStr) -> None:
+        """
+        Streams the item rows into a table, right before the template row, which is removed afterwards.
+        Every row is a copy of the template row's w:tr with its texts replaced, so the table is
+        never indexed and the cost per row stays constant, however long the invoice is.
+        """
+        template_tr = template_row._tr
+        for t in template_tr.iter(qn('w:t')):
+            self.create_attribute(t, 'xml:space', 'preserve')
+
+        for item in items:
+            texts = (
+                f'{item["description"]}',
+                f'{self.format_number(item["qty"], 0)}',
+                f'{symbol} {self.format_number(item["unit_amt"])}',
+                f'{symbol} {self.format_number(item["base_amt"])}',
+                f'{symbol} {self.format_number(item["vat_amt"])}',
+                f'{symbol} {self.format_number(item["total_amt"])}',
+            )
+
+            tr = deepcopy(template_tr)
+            for tc, t, text in zip(tr.tc_lst, tr.iter(qn('w:t')), texts):
+                if '\t' in text or '\n' in text:
+                    # tabs and line breaks need their own run elements
+                    _Cell(tc, table).text = text
+                else:
+                    t.text = text
+            template_tr.addprevious(tr)
+
+        template_tr.getparent().remove(template_tr)
 
 
     def set_body(self, document: Document, data: Dict) -> None:
         # Factuur detail
-        aantal_artikels = len(data["items"].keys())
-
         detail_tabel_titel = document.add_paragraph('Details')
         detail_tabel_titel.style = document.styles['Heading 2']
-        detail_tabel = document.add_table(rows=aantal_artikels + 2, cols=6)
+        detail_tabel = document.add_table(rows=3, cols=6)
 
         detail_tabel.autofit = False 
         detail_tabel.allow_autofit = False
@@ -274,35 +389,37 @@ class DocHelper:
 
         # BTW
         detail_tabel.columns[4].width = Cm(3)
-        detail_tabel.rows[0].cells[4].text = 'BTW (21%)'
+        detail_tabel.rows[0].cells[4].text = 'BTW'
 
         # Bedrag
         detail_tabel.columns[5].width = Cm(3)
         detail_tabel.rows[0].cells[5].text = 'Bedrag incl. BTW'
 
         # DETAILS
-        counter = 1
-        for item_nr in data["items"].keys():
-            detail_tabel.rows[counter].cells[0].text = f'{data["items"][item_nr]["description"]}'
-            detail_tabel.rows[counter].cells[1].text = f'{self.format_number(data["items"][item_nr]["qty"], 0)}'
-            detail_tabel.rows[counter].cells[2].text = f'{data["symbol"]} {self.format_number(data["items"][item_nr]["unit_amt"])}'
-            detail_tabel.rows[counter].cells[3].text = f'{data["symbol"]} {self.format_number(data["items"][item_nr]["base_amt"])}'
-            detail_tabel.rows[counter].cells[4].text = f'{data["symbol"]} {self.format_number(data["items"][item_nr]["vat_amt"])}'
-            detail_tabel.rows[counter].cells[5].text = f'{data["symbol"]} {self.format_number(data["items"][item_nr]["total_amt"])}'
-            counter += 1
+        # the middle row is the template for the item rows
+        sjabloon_rij, totaal_rij = detail_tabel.rows[1], detail_tabel.rows[2]
+        for cell in sjabloon_rij.cells:
+            cell.text = ' '
+
+        items = data["items"].values() if isinstance(data["items"], dict) else data["items"]
+        self.add_item_rows(detail_tabel, sjabloon_rij, items, data["symbol"])
 
         # Totaal
-        detail_tabel.rows[aantal_artikels+1].cells[4].paragraphs[0].add_run('Subtotaal')
-        detail_tabel.rows[aantal_artikels+1].cells[4].paragraphs[0].add_run().add_break(WD_BREAK.LINE)
-        detail_tabel.rows[aantal_artikels+1].cells[4].paragraphs[0].add_run('BTW')
-        detail_tabel.rows[aantal_artikels+1].cells[4].paragraphs[0].add_run().add_break(WD_BREAK.LINE)
-        detail_tabel.rows[aantal_artikels+1].cells[4].paragraphs[0].add_run('Totaal').bold = True
-
-        detail_tabel.rows[aantal_artikels+1].cells[5].paragraphs[0].add_run(f'{data["symbol"]} {self.format_number(data["invoice_base_amt"])}').bold = False
-        detail_tabel.rows[aantal_artikels+1].cells[5].paragraphs[0].add_run().add_break(WD_BREAK.LINE)
-        detail_tabel.rows[aantal_artikels+1].cells[5].paragraphs[0].add_run(f'{data["symbol"]} {self.format_number(data["invoice_vat_amt"])}')
-        detail_tabel.rows[aantal_artikels+1].cells[5].paragraphs[0].add_run().add_break(WD_BREAK.LINE)
-        detail_tabel.rows[aantal_artikels+1].cells[5].paragraphs[0].add_run(f'{data["symbol"]} {self.format_number(data["invoice_total_amt"])}').bold = True
+        totaal_cellen = totaal_rij.cells
+        totaal_cellen[4].paragraphs[0].add_run('Subtotaal')
+        totaal_cellen[4].paragraphs[0].add_run().add_break(WD_BREAK.LINE)
+        totaal_cellen[5].paragraphs[0].add_run(f'{data["symbol"]} {self.format_number(data["invoice_base_amt"])}').bold = False
+        totaal_cellen[5].paragraphs[0].add_run().add_break(WD_BREAK.LINE)
+
+        # one vat line per rate
+        for label, vat_amt in self.vat_lines(data):
+            totaal_cellen[4].paragraphs[0].add_run(label)
+            totaal_cellen[4].paragraphs[0].add_run().add_break(WD_BREAK.LINE)
+            totaal_cellen[5].paragraphs[0].add_run(f'{data["symbol"]} {self.format_number(vat_amt)}')
+            totaal_cellen[5].paragraphs[0].add_run().add_break(WD_BREAK.LINE)
+
+        totaal_cellen[4].paragraphs[0].add_run('Totaal').bold = True
+        totaal_cellen[5].paragraphs[0].add_run(f'{data["symbol"]} {self.format_number(data["invoice_total_amt"])}').bold = True
 
         self.set_table_border_template(detail_tabel, BorderTemplate.DETAIL_1)
 
@@ -1,25 +1,120 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from typing import Dict, AnyStr, Tuple
+from typing import Dict, AnyStr, List, Tuple, Union
 from docx import Document
 from docx.shared import Cm
-from enumerations import DocumentType, InvoiceTemplate, OfferTemplate, BorderTemplate
-from json import load, dumps
+from enumerations import DocumentType, InvoiceTemplate, OfferTemplate, BorderTemplate, RenderBackend, RoundingPolicy
 
 from config import Config
 from doc_helper import DocHelper
+from refdata import reference_data
+from parties import compiled_parties
+from doc_skeleton import skeletons
+from pdf_converter import PdfConverter
+from sequences import SequenceAllocator
+from totals import TotalsEngine
+from models import Invoice, Totals, line_items
+from validation import validator
+
+
+# render backend per invoice template, the docx path stays the default
+DEFAULT_RENDER_BACKENDS = {
+    InvoiceTemplate.ARGENTA: RenderBackend.DOCX,
+    InvoiceTemplate.NEON: RenderBackend.DOCX,
+}
+
+
+def render_docx(data: Union[Dict, Invoice], docx_path: AnyStr) -> Dict:
+    """
+    Builds a document from its header, body and footer data and saves it as docx.
+    Lives at module level so it can run in a worker process.
+    Args:
+        data (Union[Dict, Invoice]): The document data, or an invoice. When it has a 'skeleton_key', the document
+                                     starts from the cached skeleton for that key instead of being built from scratch.
+        docx_path (AnyStr): Where to save the document.
+    Returns:
+        Dict: The render and save timings in seconds.
+    """
+
+    t0 = time.perf_counter()
+
+    if isinstance(data, Invoice):
+        data = data.to_doc_data()
+
+    dhelpr = DocHelper()
+
+    if data.get("skeleton_key") is not None:
+        # styles, logo and footers come from the skeleton
+        document = skeletons.get(data["skeleton_key"], data["header"], data["footer"])
+        dhelpr.fill_header(document, data["header"])
+        dhelpr.set_body(document, data["body"])
+    else:
+        # create a new document
+        document = Document()
+
+        # set the styles for the document
+        dhelpr.set_styles(document)
+
+        # set the header, body and footer
+        dhelpr.set_header(document, data["header"])
+        dhelpr.set_body(document, data["body"])
+        dhelpr.set_footer(document, data["footer"])
+
+    t1 = time.perf_counter()
+    document.save(docx_path)
+    t2 = time.perf_counter()
+
+    return {"render": t1 - t0, "save": t2 - t1}
+
+
+def render_pdf(data: Union[Dict, Invoice], pdf_path: AnyStr) -> Dict:
+    """
+    Draws a document straight to pdf, without docx or LibreOffice.
+    Lives at module level so it can run in a worker process.
+    Args:
+        data (Union[Dict, Invoice]): The document data, or an invoice.
+        pdf_path (AnyStr): Where to save the pdf.
+    Returns:
+        Dict: The render timing in seconds.
+    """
+
+    # reportlab is only needed by this backend
+    from pdf_renderer import PdfRenderer
+
+    t0 = time.perf_counter()
+
+    if isinstance(data, Invoice):
+        data = data.to_doc_data()
+
+    PdfRenderer().render(data, pdf_path)
+
+    return {"render": time.perf_counter() - t0}
 
 
 class DocProcessor:
 
-    def __init__(self, data: Dict = {}, is_test_run: bool = True) -> None:
+    def __init__(self,
+                 data: Dict = {},
+                 is_test_run: bool = True,
+                 converter: PdfConverter = None,
+                 render_backends: Dict = None,
+                 rounding: RoundingPolicy = RoundingPolicy.PER_LINE) -> None:
         
         self.db = None
         self.set_data(data)
         self.is_test_run = is_test_run
+        self.converter = converter
+        self.render_backends = {**DEFAULT_RENDER_BACKENDS, **(render_backends or {})}
+        self.totals = TotalsEngine(rounding)
 
         try:
-            with open(Config.PATH_DB, "r") as f:
-                self.db = load(f)
+            # the db is parsed once per process and shared read-only between processors
+            self.refdata = reference_data(Config.PATH_DB)
+            self.store = self.refdata.store
+            self.sequences = SequenceAllocator(self.store)
+            self.db = self.refdata.get()
         except Exception as e:
             raise Exception(f"Could not initialize DB: {e}")
     
@@ -28,56 +123,17 @@ class DocProcessor:
         self.data = data
         
 
-    def __check_data(self, data) -> bool:
-        try:
-            # level 1 check
-            for s in ["delivery_date", "items"]:
-                if s not in data:
-                    raise Exception(f"Missing field: {s}")
-            
-            # conditional checks for debtor
-            if not "debtor_id" in data or not "debtor_details" in data:
-                raise Exception("Missing field: debtor_id or debtor_details")
-            elif not "debtor_id" in data and "debtor_details" in data:
-                for s in ["name", "street", "number", "city", "zip", "country", "vat", "bank_account", "rpr"]:
-                    if s not in data["debtor_details"]:
-                        raise Exception(f"Missing field: {s}")
-            
-            # conditional checks items
-            for s in ["description", "qty", "vat_pct", "base_amt"]:
-                if not all(s in item for item in data["items"]):
-                    raise Exception(f"Missing field: {s}")
-            
-            return True
-            
-        except Exception as e:
-            print(e)
-            return False
-    
-
-    def __generate(self, data: Dict, doc_name: AnyStr) -> None:
+    def __generate(self, data: Union[Dict, Invoice], doc_name: AnyStr, backend: RenderBackend = RenderBackend.DOCX) -> None:
         """
         fucntion to generate the actual document
         """
-        # Check if the data is valid
-        # if not self.__check_data(data):
-        #     return None
-        
-        # create a new document
-        dhelpr = DocHelper()
-        document = Document()
-
-        # set the styles for the document
-        dhelpr.set_styles(document)
-
-        # set the header, body and footer
-        dhelpr.set_header(document, data["header"])
-        dhelpr.set_body(document, data["body"])
-        dhelpr.set_footer(document, data["footer"])
+        if backend == RenderBackend.PDF:
+            render_pdf(data, f'files/invoices/{doc_name}.pdf')
+            return None
 
-        # save the document and convert it to pdf
-        document.save(f'files/invoices/{doc_name}.docx')
-        dhelpr.convert_to_pdf(f'files/invoices/{doc_name}.docx', f'files/invoices/{doc_name}.pdf')
+        # build and save the document, then convert it to pdf
+        render_docx(data, f'files/invoices/{doc_name}.docx')
+        DocHelper(self.converter).convert_to_pdf(f'files/invoices/{doc_name}.docx', f'files/invoices/{doc_name}.pdf')
 
         return None
 
@@ -104,10 +160,47 @@ class DocProcessor:
         
         self.is_test_run = is_test_run
         
-        # Check if the data is valid
-        # if not self.__check_data(self.data):
-        #     return None
+        # check the data before a number is reserved or anything is built
+        validator(doc_type, invoice_type).check_batch([self.data], self.db)
         
+        if doc_type == DocumentType.INVOICE and not self.is_test_run:
+            # reserve the number first, so concurrent runs never issue it twice
+            creditor_id = self.data.get("creditor_id", self.db["defaults"]["creditor_id"])
+            with self.sequences.reserve(creditor_id, doc_type) as reservation:
+                number = reservation.take()
+                try:
+                    invoice = self.build_invoice(self.data, invoice_type, number - 1)
+                    self.generate_invoice(invoice, self.render_backends[invoice_type])
+                except Exception:
+                    reservation.give_back(number)
+                    raise
+            return
+
+        if doc_type == DocumentType.INVOICE:
+            self.generate_invoice(self.build_invoice(self.data, invoice_type), self.render_backends[invoice_type])
+        elif doc_type == DocumentType.OFFER:
+            self.generate_offer(self.build_doc_data(self.data, doc_type, invoice_type))
+
+
+    def build_doc_data(self,
+                       data: Dict,
+                       doc_type: DocumentType = DocumentType.INVOICE,
+                       invoice_type: InvoiceTemplate = InvoiceTemplate.NEON,
+                       last_seq: int = None) -> Dict:
+        """
+        Resolves the input data against the db into the header, body and footer data of a document.
+        Args:
+            data (Dict): The input data of the document.
+            doc_type (DocumentType): The document type.
+            invoice_type (InvoiceTemplate): The invoice template.
+            last_seq (int, optional): The sequence number to count on from. Defaults to the creditor's last sequence.
+        Returns:
+            Dict: The document data, as expected by DocHelper.
+        """
+
+        if doc_type == DocumentType.INVOICE:
+            return self.build_invoice(data, invoice_type, last_seq).to_doc_data()
+
         doc_data = {
             "header": {
                 "path_image": 'files/images/tokaio.png'
@@ -115,139 +208,273 @@ class DocProcessor:
             "body": {},
             "footer": {}
         }
-        
+
+        if doc_type == DocumentType.OFFER:
+            doc_data["header"]["title"] = "Offerte"
+
+        return doc_data
+
+
+    def build_invoice(self,
+                      data: Dict,
+                      invoice_type: InvoiceTemplate = InvoiceTemplate.NEON,
+                      last_seq: int = None) -> Invoice:
+        """
+        Resolves the input data of an invoice against the db.
+        Args:
+            data (Dict): The input data of the invoice.
+            invoice_type (InvoiceTemplate): The invoice template.
+            last_seq (int, optional): The sequence number to count on from. Defaults to the creditor's last sequence
+                                      in the store.
+        Returns:
+            Invoice: The invoice, sharing its parties, policies and symbol with the other invoices.
+        """
+
         # all the default selection logic goes here
-        if doc_type == DocumentType.INVOICE:
-            
-            # title
-            doc_data["header"]["title"] = "Factuur"
-            
-            # invoice date
-            if "invoice_date" in self.data:
-                doc_data["header"]["invoice_date"] = self.data["invoice_date"]
-            else:
-                doc_data["header"]["invoice_date"] = datetime.now().strftime("%d-%m-%Y")
-            
-            # delivery date
-            if 'period' in self.data:
-                doc_data["header"]["period"] = self.data["period"]
-            elif "delivery_date" in self.data:
-                doc_data["header"]["delivery_date"] = self.data["delivery_date"]
-            else:
-                doc_data["header"]["delivery_date"] = datetime.now().strftime("%d-%m-%Y")
-            
-            # due date
-            if "due_date" in self.data:
-                doc_data["header"]["due_date"] = self.data["due_date"]
-            else:
-                doc_data["header"]["due_date"] = (datetime.now() + timedelta(days=30)).strftime("%d-%m-%Y")
-            
-            doc_data["body"]["due_date"] = doc_data["header"]["due_date"]
-            
-            # debtor
-            debtor = self.db["companies"][self.data["debtor_id"]]
-            for key in debtor.keys():
-                doc_data["header"]['debtor_' + key] = debtor[key]
-
-            # policies
-            policies = [self.db["policies"][pid] for pid in self.db["defaults"]["policy_ids"]]
-            doc_data["body"]["policies"] = policies
-
-            # symbol
-            currency = self.db["currencies"][self.db["defaults"]["currency_id"]]
-            doc_data["body"]["symbol"] = currency["symbol"]
-
-            # payment date
-            if "payment_date" in self.data:
-                doc_data["body"]["payment_date"] = self.data["payment_date"]
-
-            # items
-            invoice_base_amt = 0
-            invoice_vat_amt = 0
-            invoice_total_amt = 0
-            doc_data["body"]["items"] = {}
-
-            if invoice_type == InvoiceTemplate.NEON:
-                items = self.data["items"]
-
-                for item_key in items.keys():
-                    # calculations
-                    price = items[item_key]["price"]
-                    base_amt = items[item_key]["qty"] * price
-                    vat_amt = round(base_amt * items[item_key]["vat_pct"], 2)
-                    total_amt = base_amt + vat_amt
-                    invoice_base_amt += base_amt
-                    invoice_vat_amt += vat_amt
-                    invoice_total_amt += total_amt
-
-                    # building items
-                    doc_data["body"]["items"][item_key] = {}
-                    doc_data["body"]["items"][item_key]["description"] = items[item_key]["description"]
-                    doc_data["body"]["items"][item_key]["qty"] = items[item_key]["qty"]
-                    doc_data["body"]["items"][item_key]["unit_amt"] = price
-                    doc_data["body"]["items"][item_key]["base_amt"] = base_amt
-                    doc_data["body"]["items"][item_key]["vat_amt"] = vat_amt
-                    doc_data["body"]["items"][item_key]["total_amt"] = total_amt
-            
-            elif invoice_type == InvoiceTemplate.ARGENTA:
-                consultancy_days = self.data["consultancy_days"]
-
-                # day rate
-                if 'day_rate' in self.data:
-                    day_rate = self.data["day_rate"]
-                else:
-                    day_rate = self.db["defaults"]["argenta"]["day_rate"]
-
-                base_amt = consultancy_days * day_rate
-                vat_amt = round(base_amt * 0.21, 2)
-
-                doc_data["body"]["items"]["1"] = {
-                    "description": self.db["defaults"]["argenta"]["item_description"],
-                    "qty": consultancy_days,
-                    "unit_amt": day_rate,
-                    "base_amt": base_amt,
-                    "vat_amt": vat_amt,
-                    "total_amt": base_amt + vat_amt
+        # companies, policies and currencies are resolved once per version of the db
+        parties = compiled_parties(self.db)
+        context = parties.context()
+
+        # creditor
+        if 'creditor_id' in data:
+            creditor_id = data['creditor_id']
+        else:
+            creditor_id = self.db["defaults"]["creditor_id"]
+
+        # invoice number
+        if last_seq is None:
+            last_seq = self.store.last_sequence(creditor_id, DocumentType.INVOICE)
+        invoice_nr = self.get_next_doc_sequence(DocumentType.INVOICE, last_seq)[1]
+
+        invoice = Invoice(
+            invoice_nr=invoice_nr,
+            title="Factuur",
+            path_image='files/images/tokaio.png',
+            invoice_date=data["invoice_date"] if "invoice_date" in data else datetime.now().strftime("%d-%m-%Y"),
+            due_date=data["due_date"] if "due_date" in data else (datetime.now() + timedelta(days=30)).strftime("%d-%m-%Y"),
+            payment_date=data.get("payment_date"),
+            debtor_id=data["debtor_id"],
+            creditor_id=creditor_id,
+            debtor=parties.party(data["debtor_id"]),
+            creditor=parties.party(creditor_id),
+            symbol=context["symbol"],
+            policies=context["policies"],
+            # everything but the debtor, items and totals is shared per creditor and template
+            skeleton_key=(creditor_id, DocumentType.INVOICE.value, invoice_type.value),
+        )
+
+        # delivery date
+        if 'period' in data:
+            invoice.period = data["period"]
+        else:
+            invoice.delivery_date = data["delivery_date"] if "delivery_date" in data else datetime.now().strftime("%d-%m-%Y")
+
+        # items and totals
+        items = self.get_invoice_items(data, invoice_type)
+        lines, vat_rates = self.totals.compute_cents(*self.totals.columns([items.values()]))[0]
+        invoice.items = line_items(items, lines)
+        invoice.totals = Totals.from_rates(vat_rates)
+
+        return invoice
+
+
+    def get_invoice_items(self, data: Dict, invoice_type: InvoiceTemplate = InvoiceTemplate.NEON) -> Dict:
+        """
+        Returns the lines of an invoice by item key, each with a 'description', 'qty', 'price' and 'vat_pct'.
+        Args:
+            data (Dict): The input data of the invoice.
+            invoice_type (InvoiceTemplate, optional): The invoice template. Defaults to InvoiceTemplate.NEON.
+        Raises:
+            Exception: If the invoice type is invalid.
+        """
+
+        if invoice_type == InvoiceTemplate.NEON:
+            return data["items"]
+
+        elif invoice_type == InvoiceTemplate.ARGENTA:
+            argenta = self.db["defaults"]["argenta"]
+
+            return {
+                "1": {
+                    "description": argenta["item_description"],
+                    "qty": data["consultancy_days"],
+                    "price": data.get("day_rate", argenta["day_rate"]),
+                    "vat_pct": data.get("vat_pct", argenta.get("vat_pct", 0.21))
                 }
+            }
 
-                invoice_base_amt = base_amt
-                invoice_vat_amt = vat_amt
-                invoice_total_amt = base_amt + vat_amt
+        raise Exception("Invalid invoice type")
 
+
+    def compute_totals(self, inputs: List[Dict], invoice_type: InvoiceTemplate = InvoiceTemplate.NEON) -> List[Dict]:
+        """
+        Computes the totals of many invoices in one pass, without building any document,
+        e.g. to reconcile a year of invoices.
+        Args:
+            inputs (List[Dict]): The input data of every invoice, as passed to set_data.
+            invoice_type (InvoiceTemplate, optional): The invoice template. Defaults to InvoiceTemplate.NEON.
+        Returns:
+            List[Dict]: The totals per input, in input order, as returned by TotalsEngine.compute.
+        Raises:
+            ValidationError: If any input is invalid.
+        """
+
+        validator(DocumentType.INVOICE, invoice_type).check_batch(inputs, self.db)
+        return self.totals.compute_many(self.get_invoice_items(data, invoice_type).values() for data in inputs)
+
+
+    def generate_batch(self,
+                       inputs: List[Dict],
+                       workers: int = None,
+                       invoice_type: InvoiceTemplate = InvoiceTemplate.NEON,
+                       is_test_run: bool = True) -> List[Dict]:
+        """
+        Generates a batch of invoices, spreading the document building over a process pool
+        and the pdf conversion over the LibreOffice workers of a PdfConverter.
+        Invoice numbers are reserved as one block per creditor and allocated in the order of the inputs;
+        numbers of documents that failed are returned to the store.
+        Args:
+            inputs (List[Dict]): The input data of every invoice, as passed to set_data.
+            workers (int, optional): Number of worker processes and soffice instances. Defaults to the cpu count.
+            invoice_type (InvoiceTemplate, optional): The invoice template. Defaults to InvoiceTemplate.NEON.
+            is_test_run (bool, optional): When False, the used sequence numbers are saved to the db. Defaults to True.
+        Returns:
+            List[Dict]: One result per input, in input order, with the keys 'invoice_nr', 'docx_path',
+                        'pdf_path', 'timings' and 'error' (None on success). 'docx_path' is None
+                        when the template renders straight to pdf.
+        Raises:
+            ValidationError: If any input is invalid, before anything is reserved or rendered.
+        """
+
+        self.is_test_run = is_test_run
+        workers = workers or os.cpu_count() or 1
+        backend = self.render_backends[invoice_type]
+
+        # a bad input fails the whole batch up front, not after minutes of rendering
+        validator(DocumentType.INVOICE, invoice_type).check_batch(inputs, self.db)
+
+        results = [
+            {"invoice_nr": None, "docx_path": None, "pdf_path": None, "timings": {}, "error": None}
+            for _ in inputs
+        ]
+
+        # allocate the invoice numbers in input order, per creditor
+        creditor_ids = [data.get("creditor_id", self.db["defaults"]["creditor_id"]) for data in inputs]
+        last_seqs = {}
+        reservations = {}
+        numbers = {}
+        committed = False
+
+        try:
+            if not self.is_test_run:
+                # reserve a block per creditor up front, so concurrent runs never share numbers
+                for creditor_id in dict.fromkeys(creditor_ids):
+                    if creditor_id in self.db["companies"]:
+                        reservations[creditor_id] = self.sequences.reserve(
+                            creditor_id, DocumentType.INVOICE, creditor_ids.count(creditor_id)
+                        )
+
+            jobs = []
+            for i, data in enumerate(inputs):
+                t0 = time.perf_counter()
+                creditor_id = creditor_ids[i]
+                try:
+                    if self.is_test_run:
+                        if creditor_id not in last_seqs:
+                            last_seqs[creditor_id] = self.store.last_sequence(creditor_id, DocumentType.INVOICE)
+                        number = last_seqs[creditor_id] + 1
+                    else:
+                        number = numbers[i] = reservations[creditor_id].take()
+
+                    invoice = self.build_invoice(data, invoice_type, number - 1)
+                    last_seqs[creditor_id] = number
+
+                    doc_name = f'I_{invoice.invoice_nr}'
+                    results[i]["invoice_nr"] = invoice.invoice_nr
+                    if backend == RenderBackend.DOCX:
+                        results[i]["docx_path"] = f'files/invoices/{doc_name}.docx'
+                    results[i]["pdf_path"] = f'files/invoices/{doc_name}.pdf'
+                    jobs.append((i, invoice))
+                except Exception as e:
+                    results[i]["error"] = e
+                results[i]["timings"]["build"] = time.perf_counter() - t0
+
+            if backend == RenderBackend.PDF:
+                self.__render_batch_pdf(jobs, results, workers)
             else:
-                raise Exception("Invalid invoice type")
-            
-            # totals
-            doc_data["body"]["invoice_base_amt"] = invoice_base_amt
-            doc_data["body"]["invoice_vat_amt"] = invoice_vat_amt
-            doc_data["body"]["invoice_total_amt"] = invoice_total_amt
-
-            # creditor
-            if 'creditor_id' in self.data:
-                creditor_id = self.data['creditor_id']
-            else:
-                creditor_id = self.db["defaults"]["creditor_id"]
+                self.__render_batch_docx(jobs, results, workers)
+
+            if not self.is_test_run:
+                records = [
+                    invoice.to_record(results[i]["pdf_path"])
+                    for i, invoice in jobs
+                    if results[i]["error"] is None
+                ]
+                self.store.commit_batch(DocumentType.INVOICE, records)
+                committed = True
+        finally:
+            # numbers of failed documents, or of the whole run when it aborted, go back to the store
+            for i, number in numbers.items():
+                if not committed or results[i]["error"] is not None:
+                    reservations[creditor_ids[i]].give_back(number)
+            for reservation in reservations.values():
+                reservation.release()
+
+        return results
+
+
+    def __render_batch_pdf(self, jobs: List[Tuple[int, Invoice]], results: List[Dict], workers: int) -> None:
+        # documents are drawn straight to pdf, there is nothing to convert
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            renders = {
+                pool.submit(render_pdf, invoice, results[i]["pdf_path"]): i
+                for i, invoice in jobs
+            }
+            for future in as_completed(renders):
+                i = renders[future]
+                try:
+                    results[i]["timings"].update(future.result())
+                except Exception as e:
+                    results[i]["error"] = e
+
+
+    def __render_batch_docx(self, jobs: List[Tuple[int, Invoice]], results: List[Dict], workers: int) -> None:
+        if not jobs:
+            return
+
+        converter = self.converter or PdfConverter(workers=workers)
+        try:
+            conversions = {}
 
-            creditor = self.db["companies"][creditor_id]
-            for key in creditor.keys():
-                if key not in ["last_sequences"]:
-                    doc_data["footer"]['creditor_' + key] = creditor[key]
+            def converted(future, i, t0):
+                results[i]["timings"]["convert"] = time.perf_counter() - t0
 
-                    # add creditor bank account for trailing message
-                    if key == "bank_account":
-                        doc_data["body"]['creditor_' + key] = creditor[key]
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                renders = {
+                    pool.submit(render_docx, invoice, results[i]["docx_path"]): i
+                    for i, invoice in jobs
+                }
 
-                else:
-                    # invoice number
-                    next_seq = self.get_next_doc_sequence(doc_type, creditor['last_sequences']["invoice"])
-                    doc_data["header"][next_seq[0]] = next_seq[1]
-            
-            self.generate_invoice(doc_data)
+                # convert every document as soon as it is saved
+                for future in as_completed(renders):
+                    i = renders[future]
+                    try:
+                        results[i]["timings"].update(future.result())
+                        t0 = time.perf_counter()
+                        conversions[i] = converter.submit(results[i]["docx_path"], results[i]["pdf_path"])
+                        conversions[i].add_done_callback(lambda f, i=i, t0=t0: converted(f, i, t0))
+                    except Exception as e:
+                        results[i]["error"] = e
+
+            for i, future in conversions.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    results[i]["error"] = e
+        finally:
+            if converter is not self.converter:
+                converter.close()
 
-        elif doc_type == DocumentType.OFFER:
-            doc_data["header"]["title"] = "Offerte"
-            self.generate_offer(doc_data)
-        
 
     def generate_offer(self, data: Dict):
         
@@ -256,20 +483,20 @@ class DocProcessor:
         self.__generate(self.data, doc_name)
 
 
-    def generate_invoice(self, data: Dict):
+    def generate_invoice(self, invoice: Invoice, backend: RenderBackend = RenderBackend.DOCX):
         
         # Create an invoice
-        doc_name = f'I_{data["header"]["invoice_nr"]}'
-        self.__generate(data, doc_name)
+        doc_name = f'I_{invoice.invoice_nr}'
+        self.__generate(invoice, doc_name, backend)
 
         if not self.is_test_run:
-            # Update the database
-            self.save_db(DocumentType.INVOICE, increase_seq=True)
+            # Store the invoice, its number was reserved by the caller
+            self.store.commit_invoice(DocumentType.INVOICE, invoice.to_record(f'files/invoices/{doc_name}.pdf'))
 
 
     def save_db(self, DocType: DocumentType, increase_seq: bool = False) -> None:
         """
-        Save the current state of the database to a file.
+        Save the reference data to the store and refresh the processor's view of it.
         Args:
             DocType (DocumentType): The type of document being processed (e.g., OFFER or INVOICE).
             increase_seq (bool, optional): Flag indicating whether to increment the sequence number for the document type. Defaults to False.
@@ -277,11 +504,10 @@ class DocProcessor:
             None
         """
         
-        seq_id = "offer" if DocType == DocumentType.OFFER else "invoice"
-        
         if increase_seq:
-            self.db["companies"][self.data["creditor_id"]]["last_sequences"][seq_id] += 1
+            creditor_id = self.data.get("creditor_id", self.db["defaults"]["creditor_id"])
+            self.sequences.reserve(creditor_id, DocType).take()
         
-        with open(Config.PATH_DB, "w") as f:
-            f.write(dumps(self.db, sort_keys=True, indent=4))
+        self.store.save(self.db)
+        self.db = self.refdata.get()
     
\ No newline at end of file
@@ -0,0 +1,75 @@
+import io
+import threading
+from typing import Dict, Hashable
+
+from docx import Document
+
+from doc_helper import DocHelper
+
+
+class SkeletonCache:
+
+    def __init__(self):
+        """
+        Cache of pre-built document skeletons, keyed by creditor and template.
+        A skeleton holds the styles, margins, header title and logo and both footers. It is built once,
+        kept as docx bytes, and every document starts from a fresh copy of those bytes, so only the
+        debtor, the items and the totals are rendered per document.
+        Attributes:
+            skeletons (Dict[Hashable, bytes]): The serialized skeletons by key.
+        """
+
+        self.skeletons = {}
+        self.lock = threading.Lock()
+
+
+    def __build(self, header: Dict, footer: Dict) -> bytes:
+        document = Document()
+        DocHelper().set_skeleton(document, header, footer)
+
+        stream = io.BytesIO()
+        document.save(stream)
+        return stream.getvalue()
+
+
+    def get(self, key: Hashable, header: Dict, footer: Dict) -> Document:
+        """
+        Returns a new document cloned from the skeleton for the given key, building the skeleton if needed.
+        Args:
+            key (Hashable): Identifies the creditor and template, e.g. (creditor_id, DocumentType, InvoiceTemplate).
+            header (Dict): The header data; only the title and the image are used.
+            footer (Dict): The footer data of the creditor.
+        Returns:
+            Document: A document ready for DocHelper.fill_header and DocHelper.set_body.
+        """
+
+        # the data is part of the key, so reloaded reference data never hits a stale skeleton
+        key = (key, header["title"], header["path_image"], tuple(sorted(footer.items())))
+
+        skeleton = self.skeletons.get(key)
+        if skeleton is None:
+            with self.lock:
+                skeleton = self.skeletons.get(key)
+                if skeleton is None:
+                    skeleton = self.__build(header, footer)
+                    self.skeletons[key] = skeleton
+
+        return Document(io.BytesIO(skeleton))
+
+
+    def invalidate(self, key: Hashable = None) -> None:
+        """
+        Drops the skeletons for the given key, or all skeletons when no key is given.
+        Skeletons of changed creditor data are never reused, this only frees their memory.
+        """
+
+        with self.lock:
+            if key is None:
+                self.skeletons.clear()
+            else:
+                for cached in [cached for cached in self.skeletons if cached[0] == key]:
+                    del self.skeletons[cached]
+
+
+# one cache per process, shared by all processors in that process
+skeletons = SkeletonCache()
@@ -0,0 +1,196 @@
+import sqlite3
+import time
+from typing import AnyStr, Dict, List, Optional
+
+from gdrive import GDrive
+from sqlite_db import SqliteDb
+
+
+# the file fields kept in the index
+INDEX_FIELDS = "id, name, mimeType, parents, md5Checksum, size, modifiedTime, trashed"
+
+
+class DriveIndex:
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS files (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            parent TEXT,
+            mime_type TEXT,
+            md5 TEXT,
+            size INTEGER,
+            modified_time TEXT
+        );
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE INDEX IF NOT EXISTS files_parent_name ON files (parent, name);
+        CREATE INDEX IF NOT EXISTS files_name ON files (name);
+    """
+
+    def __init__(self, gdrive: GDrive, path: AnyStr, max_age: float = 60):
+        """
+        A local SQLite index of the metadata of the files in Drive, so lookups such as "does this invoice
+        already exist in Drive?" are answered without listing folders. The index is filled by one full
+        listing and then kept current through the Drive changes feed, which only returns what changed
+        since the last sync.
+        Args:
+            gdrive (GDrive): The Drive client.
+            path (AnyStr): Path to the SQLite file of the index.
+            max_age (float, optional): Lookups sync the index first when it is older than this many seconds.
+                                       Defaults to 60.
+        """
+
+        self.gdrive = gdrive
+        self.path = path
+        self.max_age = max_age
+        self.db = SqliteDb(path, row_factory=sqlite3.Row)
+        self.synced_at = 0
+
+        self.db.connect().executescript(self.SCHEMA)
+
+
+    def __meta(self, key: AnyStr) -> Optional[AnyStr]:
+        row = self.db.connect().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+
+    def __upsert(self, con: sqlite3.Connection, file: Dict) -> None:
+        if file.get("trashed"):
+            con.execute("DELETE FROM files WHERE id = ?", (file["id"],))
+            return
+
+        con.execute(
+            "INSERT OR REPLACE INTO files (id, name, parent, mime_type, md5, size, modified_time) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                file["id"],
+                file["name"],
+                (file.get("parents") or [None])[0],
+                file.get("mimeType"),
+                file.get("md5Checksum"),
+                int(file["size"]) if "size" in file else None,
+                file.get("modifiedTime"),
+            )
+        )
+
+
+    def sync(self) -> None:
+        """
+        Brings the index up to date. The first sync lists every file; later syncs apply the changes feed
+        from where the previous sync stopped. Every page is applied in one transaction with its page token,
+        so an interrupted sync continues where it left off. Pages are fetched before their transaction
+        starts, so other writers never wait for the network.
+        """
+
+        # pylint: disable=E1101
+        changes = self.gdrive.service.changes()
+        page_token = self.__meta("page_token")
+
+        if page_token is None:
+            # take the token before listing, so changes made during the listing are applied next time
+            page_token = changes.getStartPageToken().execute()["startPageToken"]
+
+            files = list(self.gdrive.iter_files("trashed=false", INDEX_FIELDS))
+
+            with self.db.transaction() as con:
+                con.execute("DELETE FROM files")
+                for file in files:
+                    self.__upsert(con, file)
+                con.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('page_token', ?)", (page_token,))
+
+        while page_token is not None:
+            results = changes.list(
+                pageToken=page_token,
+                pageSize=1000,
+                spaces="drive",
+                fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({INDEX_FIELDS}))"
+            ).execute()
+
+            with self.db.transaction() as con:
+                for change in results.get("changes", []):
+                    if change.get("removed") or "file" not in change:
+                        con.execute("DELETE FROM files WHERE id = ?", (change["fileId"],))
+                    else:
+                        self.__upsert(con, change["file"])
+
+                # the last page carries the token to start from next time
+                next_token = results.get("nextPageToken") or results["newStartPageToken"]
+                con.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('page_token', ?)", (next_token,))
+
+            page_token = results.get("nextPageToken")
+
+        self.synced_at = time.monotonic()
+
+
+    def refresh(self) -> None:
+        """
+        Syncs the index when it is older than max_age.
+        """
+
+        if time.monotonic() - self.synced_at > self.max_age:
+            self.sync()
+
+
+    def record(self, file: Dict) -> None:
+        """
+        Adds or updates a file the caller just created or changed, so it can be found before the next sync.
+        Args:
+            file (Dict): The file's fields as returned by Drive, at least 'id' and 'name'.
+        """
+
+        with self.db.transaction() as con:
+            self.__upsert(con, file)
+
+
+    def __files(self, query: AnyStr, params: tuple) -> List[Dict]:
+        self.refresh()
+        rows = self.db.connect().execute(f"SELECT * FROM files WHERE {query} ORDER BY name", params).fetchall()
+        return [
+            {
+                "id": row["id"],
+                "name": row["name"],
+                "parents": [row["parent"]] if row["parent"] else [],
+                "mimeType": row["mime_type"],
+                "md5Checksum": row["md5"],
+                "size": row["size"],
+                "modifiedTime": row["modified_time"],
+            }
+            for row in rows
+        ]
+
+
+    def get(self, file_id: AnyStr) -> Optional[Dict]:
+        """
+        Returns the indexed fields of a file, or None when it is not in Drive.
+        """
+
+        files = self.__files("id = ?", (file_id,))
+        return files[0] if files else None
+
+
+    def find(self, name: AnyStr, parent_folder_id: AnyStr = None) -> List[Dict]:
+        """
+        Returns the files with the given name, in the given folder or anywhere.
+        """
+
+        if parent_folder_id is None:
+            return self.__files("name = ?", (name,))
+        return self.__files("parent = ? AND name = ?", (parent_folder_id, name))
+
+
+    def exists(self, name: AnyStr, parent_folder_id: AnyStr = None) -> bool:
+        """
+        Whether a file with the given name exists, in the given folder or anywhere.
+        Example:
+            >>> index.exists("I_2024-11.pdf", Config.DIR_ID_ARGENTA)
+            True
+        """
+
+        return len(self.find(name, parent_folder_id)) > 0
+
+
+    def children(self, parent_folder_id: AnyStr) -> List[Dict]:
+        """
+        Returns the files in a folder.
+        """
+
+        return self.__files("parent = ?", (parent_folder_id,))
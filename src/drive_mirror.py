@@ -0,0 +1,168 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import AnyStr, Dict, List
+
+from googleapiclient.errors import HttpError
+
+from gdrive import GDrive, UPLOAD_CHUNK_SIZE, UPLOAD_WORKERS, file_md5
+
+
+# version of the manifest format, a manifest of another version is discarded
+MANIFEST_VERSION = 1
+
+
+class DriveMirror:
+
+    def __init__(self, gdrive: GDrive, manifest_path: AnyStr):
+        """
+        Mirrors a local directory to a Drive folder, uploading only what changed since the last run.
+        A manifest next to the output keeps the size, modification time, md5 and Drive ID of every file
+        that was uploaded. A file whose size and modification time match the manifest is skipped without
+        reading it or calling the api; a file that was touched but has the same md5 is skipped as well.
+        Changed files replace the content of their Drive file, so their ID stays the same.
+        Args:
+            gdrive (GDrive): The Drive client.
+            manifest_path (AnyStr): Path to the manifest, a json file created on the first run.
+        Example:
+            >>> mirror = DriveMirror(gdrive, "files/invoices/.drive_manifest.json")
+            >>> mirror.sync(Config.PATH_OUT, Config.DIR_ID_ARGENTA)
+        """
+
+        self.gdrive = gdrive
+        self.manifest_path = manifest_path
+
+
+    def __load(self, parent_folder_id: AnyStr) -> Dict:
+        manifest = None
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+
+        # a manifest of another folder says nothing about this one
+        if manifest is None or manifest.get("version") != MANIFEST_VERSION or manifest.get("folder_id") != parent_folder_id:
+            manifest = {"version": MANIFEST_VERSION, "folder_id": parent_folder_id, "folders": {}, "files": {}}
+        return manifest
+
+
+    def __save(self, manifest: Dict) -> None:
+        # written to a temporary file first, so an interrupted run never leaves half a manifest
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+
+    def __folder(self, manifest: Dict, rel_dir: AnyStr) -> AnyStr:
+        # the Drive folder of a local directory, found or created the first time a file in it is uploaded
+        if rel_dir == "":
+            return manifest["folder_id"]
+        if rel_dir not in manifest["folders"]:
+            parent_id = self.__folder(manifest, os.path.dirname(rel_dir))
+            manifest["folders"][rel_dir] = self.gdrive.ensure_folder(os.path.basename(rel_dir), parent_id)
+        return manifest["folders"][rel_dir]
+
+
+    def __remote(self, folder_id: AnyStr) -> Dict[AnyStr, Dict]:
+        # the files already in a Drive folder by name, to adopt the ones the manifest does not know yet
+        return {
+            file["name"]: file
+            for file in self.gdrive.iter_folder(folder_id, "id, name, md5Checksum")
+        }
+
+
+    def __upload(self, file_path: AnyStr, folder_id: AnyStr, file_id: AnyStr, chunk_size: int) -> AnyStr:
+        if file_id is not None:
+            try:
+                return self.gdrive.upload_file(file_path, chunk_size=chunk_size, file_id=file_id)
+            except HttpError as e:
+                # the file was deleted from Drive since the last run, so it is uploaded again
+                if e.resp.status != 404:
+                    raise
+        return self.gdrive.upload_file(file_path, folder_id, chunk_size)
+
+
+    def sync(self,
+             local_dir: AnyStr,
+             parent_folder_id: AnyStr,
+             workers: int = UPLOAD_WORKERS,
+             chunk_size: int = UPLOAD_CHUNK_SIZE) -> List[Dict]:
+        """
+        Uploads the new and changed files of a local directory and its subdirectories to a Drive folder.
+        Subdirectories become subfolders. Files deleted locally are left in Drive.
+        Args:
+            local_dir (AnyStr): The directory to mirror, e.g. Config.PATH_OUT.
+            parent_folder_id (AnyStr): The ID of the Drive folder to mirror to.
+            workers (int, optional): The number of files uploaded at the same time. Defaults to UPLOAD_WORKERS.
+            chunk_size (int, optional): The size of the upload chunks. Defaults to UPLOAD_CHUNK_SIZE.
+        Returns:
+            List[Dict]: One result per uploaded file with the keys 'path', 'id' (None on failure)
+                        and 'error' (None on success). Skipped files are not included.
+        """
+
+        manifest = self.__load(parent_folder_id)
+        manifest_name = os.path.abspath(self.manifest_path)
+
+        # find the files that changed since the last run
+        pending = []
+        remote = {}
+        for root, dirs, files in os.walk(local_dir):
+            dirs.sort()
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                if os.path.abspath(file_path).startswith(manifest_name):
+                    continue
+
+                rel_path = os.path.relpath(file_path, local_dir).replace(os.sep, "/")
+                stat = os.stat(file_path)
+                entry = manifest["files"].get(rel_path)
+
+                # unchanged since the last run: no hashing, no api call
+                if entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                    continue
+
+                md5 = file_md5(file_path)
+                if entry is not None and entry["md5"] == md5:
+                    entry["mtime_ns"] = stat.st_mtime_ns
+                    continue
+
+                file_id = entry["id"] if entry is not None else None
+                rel_dir = os.path.dirname(rel_path)
+                folder_id = self.__folder(manifest, rel_dir)
+
+                if entry is None:
+                    # a file uploaded before there was a manifest is adopted when Drive has the same content
+                    if rel_dir not in remote:
+                        remote[rel_dir] = self.__remote(folder_id)
+                    existing = remote[rel_dir].get(name)
+                    if existing is not None:
+                        file_id = existing["id"]
+                        if existing.get("md5Checksum") == md5:
+                            manifest["files"][rel_path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "md5": md5, "id": file_id}
+                            continue
+
+                pending.append((file_path, rel_path, folder_id, file_id, stat, md5))
+
+        # upload them, recording every upload in the manifest as it finishes
+        results = []
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {
+                    pool.submit(self.__upload, file_path, folder_id, file_id, chunk_size): (file_path, rel_path, stat, md5)
+                    for file_path, rel_path, folder_id, file_id, stat, md5 in pending
+                }
+                for future in as_completed(futures):
+                    file_path, rel_path, stat, md5 = futures[future]
+                    try:
+                        file_id = future.result()
+                    except Exception as e:
+                        print(f"An error occurred: {e}")
+                        results.append({"path": file_path, "id": None, "error": e})
+                        continue
+
+                    manifest["files"][rel_path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "md5": md5, "id": file_id}
+                    results.append({"path": file_path, "id": file_id, "error": None})
+        finally:
+            self.__save(manifest)
+
+        return results
@@ -18,3 +18,13 @@ class OfferTemplate(Enum):
 class BorderTemplate(Enum):
     NO_BORDERS = "NO_BORDERS"
     DETAIL_1 = "DETAIL_1"
+
+
+class RenderBackend(Enum):
+    DOCX = "DOCX"
+    PDF = "PDF"
+
+
+class RoundingPolicy(Enum):
+    PER_LINE = "PER_LINE"
+    PER_RATE = "PER_RATE"
@@ -0,0 +1,245 @@
+import atexit
+import functools
+import json
+import os
+import tempfile
+import threading
+from typing import AnyStr, Dict, List
+
+import google.auth.credentials
+import google_auth_httplib2
+import httplib2
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build, build_from_document
+
+from config import Config
+from ratelimit import LimitedRequest, rate_limiter
+
+
+# discovery documents that had to be fetched are kept here between runs
+DISCOVERY_CACHE_DIR = os.path.join(tempfile.gettempdir(), "facteur-discovery")
+
+# seconds before a request without a response is given up
+HTTP_TIMEOUT = 60
+
+
+class CredentialsProvider:
+
+    def __init__(self, secret_file: AnyStr, token_file: AnyStr, scopes: List[AnyStr] = None):
+        """
+        Loads the user's credentials once and shares them between the Gmail and GDrive clients.
+        Expired credentials are not refreshed up front: the transport refreshes them on the first request,
+        so creating a client does not touch the network. Refreshed tokens are written back to the
+        token file when the process exits, so the next run can use them.
+        Args:
+            secret_file (AnyStr): Path to the client secrets file, used when the user has to log in.
+            token_file (AnyStr): Path to the token file where credentials are stored.
+            scopes (List[AnyStr], optional): The scopes to request. Defaults to Config.APP_SCOPES.
+        """
+
+        self.secret_file = secret_file
+        self.token_file = token_file
+        self.scopes = scopes or Config.APP_SCOPES
+        self.creds = None
+        self.saved_token = None
+        self.lock = threading.Lock()
+
+
+    def get(self) -> Credentials:
+        """
+        Returns the credentials, loading them from the token file on first use.
+        When there is no usable token, the user is asked to log in.
+        """
+
+        with self.lock:
+            if self.creds is None:
+                if os.path.exists(self.token_file):
+                    self.creds = Credentials.from_authorized_user_file(self.token_file, self.scopes)
+                    self.saved_token = self.creds.token
+
+                # without a refresh token the user has to log in
+                if not self.creds or not (self.creds.valid or self.creds.refresh_token):
+                    flow = InstalledAppFlow.from_client_secrets_file(self.secret_file, self.scopes)
+                    self.creds = flow.run_local_server(port=0)
+                    self.__write()
+
+                atexit.register(self.save)
+
+            return self.creds
+
+
+    def refresh(self, request, stale_token: AnyStr = None) -> None:
+        """
+        Refreshes the credentials under the lock. When several threads find the same token expired or
+        rejected, only the first one refreshes it; the others see a new token and use that one.
+        Args:
+            request: The google-auth request to refresh with.
+            stale_token (AnyStr, optional): The token that was found expired or rejected.
+        """
+
+        with self.lock:
+            if self.creds.token == stale_token or not self.creds.valid:
+                self.creds.refresh(request)
+                self.__write()
+
+
+    def __write(self) -> None:
+        with open(self.token_file, "w") as token:
+            token.write(self.creds.to_json())
+        self.saved_token = self.creds.token
+
+
+    def save(self) -> None:
+        """
+        Writes the credentials to the token file when they were refreshed since they were loaded.
+        """
+
+        with self.lock:
+            if self.creds is not None and self.creds.token != self.saved_token:
+                self.__write()
+
+
+_providers: Dict[AnyStr, CredentialsProvider] = {}
+_providers_lock = threading.Lock()
+
+
+def credentials(secret_file: AnyStr, token_file: AnyStr) -> CredentialsProvider:
+    """
+    The shared credentials provider of the token file, created on first use.
+    """
+
+    key = os.path.abspath(token_file)
+    with _providers_lock:
+        if key not in _providers:
+            _providers[key] = CredentialsProvider(secret_file, token_file)
+        return _providers[key]
+
+
+_documents: Dict[tuple, AnyStr] = {}
+_documents_lock = threading.Lock()
+
+
+def discovery_document(name: AnyStr, version: AnyStr) -> AnyStr:
+    """
+    Returns the discovery document of an api. It is read once per process: from the documents shipped
+    with googleapiclient, else from the disk cache, else fetched once and written to the disk cache.
+    """
+
+    key = (name, version)
+    with _documents_lock:
+        if key in _documents:
+            return _documents[key]
+
+        path = os.path.join(DISCOVERY_CACHE_DIR, f"{name}.{version}.json")
+        document = discovery_cache.get_static_doc(name, version)
+        if document is None and os.path.exists(path):
+            with open(path, "r") as f:
+                document = f.read()
+        elif document is None:
+            service = build(name, version, static_discovery=False, cache_discovery=False)
+            document = json.dumps(service._rootDesc)
+
+            os.makedirs(DISCOVERY_CACHE_DIR, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(document)
+            os.replace(tmp_path, path)
+
+        _documents[key] = document
+        return document
+
+
+class SharedCredentials(google.auth.credentials.Credentials):
+
+    def __init__(self, provider: CredentialsProvider):
+        """
+        The credentials of a provider as seen by the http transport of one client.
+        Every transport applies the provider's current token, and refreshes go through the provider's lock.
+        Args:
+            provider (CredentialsProvider): The provider of the credentials.
+        """
+
+        super().__init__()
+        self.provider = provider
+        self.applied = threading.local()
+
+
+    @property
+    def valid(self) -> bool:
+        return self.provider.get().valid
+
+
+    def apply(self, headers: Dict, token: AnyStr = None) -> None:
+        creds = self.provider.get()
+        self.applied.token = creds.token
+        creds.apply(headers, token)
+
+
+    def before_request(self, request, method, url, headers) -> None:
+        creds = self.provider.get()
+        if not creds.valid:
+            self.provider.refresh(request, creds.token)
+        self.apply(headers)
+
+
+    def refresh(self, request) -> None:
+        # the token this thread sent was rejected
+        self.provider.refresh(request, getattr(self.applied, "token", None))
+
+
+class ClientPool:
+
+    def __init__(self, name: AnyStr, version: AnyStr, provider: CredentialsProvider, timeout: int = HTTP_TIMEOUT):
+        """
+        Api clients for one api, one per thread. httplib2 is not thread-safe, so every thread gets its own
+        client with its own connections, which are kept alive between its requests. The credentials and
+        the rate limiter of the api are shared by all clients, and every request of a client goes through
+        the rate limiter.
+        Args:
+            name (AnyStr): The api, e.g. 'gmail' or 'drive'.
+            version (AnyStr): The version of the api, e.g. 'v1' or 'v3'.
+            provider (CredentialsProvider): The provider of the credentials.
+            timeout (int, optional): The timeout of a request in seconds. Defaults to HTTP_TIMEOUT.
+        """
+
+        self.name = name
+        self.version = version
+        self.credentials = SharedCredentials(provider)
+        self.limiter = rate_limiter(provider, name)
+        self.timeout = timeout
+        self.clients = threading.local()
+
+
+    def get(self):
+        """
+        Returns the client of the calling thread, building it on first use without a discovery lookup.
+        """
+
+        client = getattr(self.clients, "client", None)
+        if client is None:
+            http = google_auth_httplib2.AuthorizedHttp(self.credentials, http=httplib2.Http(timeout=self.timeout))
+            client = build_from_document(
+                discovery_document(self.name, self.version),
+                http=http,
+                requestBuilder=functools.partial(LimitedRequest, limiter=self.limiter)
+            )
+            self.clients.client = client
+        return client
+
+
+_pools: Dict[tuple, ClientPool] = {}
+_pools_lock = threading.Lock()
+
+
+def client_pool(provider: CredentialsProvider, name: AnyStr, version: AnyStr) -> ClientPool:
+    """
+    The shared client pool of an api for the provider's credentials, created on first use.
+    """
+
+    key = (id(provider), name, version)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ClientPool(name, version, provider)
+        return _pools[key]
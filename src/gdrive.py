@@ -1,15 +1,48 @@
 import os.path
-import io
-from typing import AnyStr, List
+import hashlib
+import mimetypes
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AnyStr, Dict, Iterator, List
 
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
+from googleapiclient.http import MediaFileUpload
 
-from config import Config
+from gauth import credentials, client_pool
+
+
+# the file fields listings return unless the caller asks for others
+LIST_FIELDS = "id, name, mimeType"
+
+# uploads are resumable, sent in chunks of this size (a multiple of 256 KB)
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# number of files uploaded at the same time by upload_many
+UPLOAD_WORKERS = 4
+
+# downloads are fetched in ranged chunks of this size
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# number of files downloaded at the same time by download_many
+DOWNLOAD_WORKERS = 4
+
+# the mime type of Drive folders
+FOLDER_MIME_TYPE = "application/vnd.google-apps.folder"
+
+# files are read in blocks of this size to compute their md5
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_md5(file_path: AnyStr) -> AnyStr:
+    """
+    Returns the md5 of a local file as a hex string, the same as Drive's md5Checksum.
+    """
+
+    md5 = hashlib.md5()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            md5.update(block)
+    return md5.hexdigest()
 
 
 class GDrive():
@@ -27,39 +60,27 @@ class GDrive():
             HttpError: If an error occurs while building the Google Drive service.
         """
 
-        self.creds = None
-        self.service = None
+        # the credentials are loaded once per token file and shared with the other clients
+        provider = credentials(secret_file, token_file)
+        self.creds = provider.get()
 
-        # Load the credentials from the token file if it exists
-        if os.path.exists(token_file):
-            self.creds = Credentials.from_authorized_user_file(token_file, Config.APP_SCOPES)
-        
-        # If there are no (valid) credentials available, let the user log in.
-        if not self.creds or not self.creds.valid:
-
-            # Refresh the credentials if they are expired
-            if self.creds and self.creds.expired and self.creds.refresh_token:
-                self.creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    secret_file, Config.APP_SCOPES
-                )
-                self.creds = flow.run_local_server(port=0)
-            
-            # Save the credentials for the next run
-            with open(token_file, "w") as token:
-                token.write(self.creds.to_json())
-        
-        try:
+        # every thread gets its own client from the pool
+        self.clients = client_pool(provider, "drive", "v3")
 
-            # Build the Google Drive service
-            self.service = build("drive", "v3", credentials=self.creds)
+        # folder IDs by parent ID and name, filled by ensure_folder
+        self.folders = {}
+        self.folders_lock = threading.Lock()
+
+
+    @property
+    def service(self):
+        """
+        The Google Drive service instance of the calling thread.
+        """
+
+        return self.clients.get()
 
-        except HttpError as error:
-            # TODO(developer) - Handle errors from drive API.
-            print(f"An error occurred: {error}")
 
-        
     def create_folder(self, folder_name, parent_folder_id=None):
         """
         Creates a folder in Google Drive.
@@ -76,7 +97,7 @@ class GDrive():
         # folder metadata
         folder_metadata = {
             'name': folder_name,
-            "mimeType": "application/vnd.google-apps.folder",
+            "mimeType": FOLDER_MIME_TYPE,
             'parents': [parent_folder_id] if parent_folder_id else []
         }
 
@@ -93,27 +114,189 @@ class GDrive():
         return created_folder["id"]
 
 
-    def list_folder(self, parent_folder_id=None, delete=False) -> List[dict]:
+    def iter_files(self,
+                   query: AnyStr = None,
+                   fields: AnyStr = LIST_FIELDS,
+                   page_size: int = 1000,
+                   order_by: AnyStr = None) -> Iterator[dict]:
+        """
+        Lists the files matching a query, following every page. Files are yielded as the pages come in.
+        Args:
+            query (AnyStr, optional): A Drive search query, e.g. "name = 'I_2024-11.pdf'". Defaults to all files.
+            fields (AnyStr, optional): The file fields to request. Defaults to LIST_FIELDS.
+            page_size (int, optional): The number of files per page. Defaults to 1000.
+            order_by (AnyStr, optional): The sort order, e.g. 'createdTime'. Defaults to Drive's order.
+        Yields:
+            dict: The requested fields of every file.
+        """
+
+        page_token = None
+        while True:
+            results = self.service.files().list(
+                q=query,
+                pageSize=page_size,
+                pageToken=page_token,
+                orderBy=order_by,
+                fields=f"nextPageToken, files({fields})"
+            ).execute()
+
+            yield from results.get('files', [])
+
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return
+
+
+    def find_folders(self, folder_name: AnyStr, parent_folder_id: AnyStr = None) -> List[AnyStr]:
+        """
+        Returns the IDs of the folders with the given name in a parent folder, oldest first.
+        Args:
+            folder_name (AnyStr): The name of the folder.
+            parent_folder_id (AnyStr, optional): The ID of the parent folder. Defaults to the root directory.
+        """
+
+        name = folder_name.replace("\\", "\\\\").replace("'", "\\'")
+        query = (
+            f"name = '{name}' and mimeType = '{FOLDER_MIME_TYPE}' "
+            f"and '{parent_folder_id or 'root'}' in parents and trashed = false"
+        )
+        return [folder["id"] for folder in self.iter_files(query, "id", order_by="createdTime")]
+
+
+    def ensure_folder(self, folder_name: AnyStr, parent_folder_id: AnyStr = None) -> AnyStr:
+        """
+        Returns the ID of a folder in a parent folder, creating it when it does not exist yet.
+        Found folders are cached, so asking again costs no api call.
+        When another run creates the same folder at the same time, both end up with two folders of the same
+        name. After creating a folder it is therefore looked up again: the oldest one is used by every run,
+        and a newer one this run created is deleted again.
+        Args:
+            folder_name (AnyStr): The name of the folder.
+            parent_folder_id (AnyStr, optional): The ID of the parent folder. Defaults to the root directory.
+        Returns:
+            AnyStr: The ID of the folder.
+        """
+
+        key = (parent_folder_id or "root", folder_name)
+        folder_id = self.folders.get(key)
+        if folder_id is not None:
+            return folder_id
+
+        # threads of this run wait for each other instead of racing
+        with self.folders_lock:
+            folder_id = self.folders.get(key)
+            if folder_id is not None:
+                return folder_id
+
+            found = self.find_folders(folder_name, parent_folder_id)
+            if not found:
+                created_id = self.create_folder(folder_name, parent_folder_id)
+                found = self.find_folders(folder_name, parent_folder_id) or [created_id]
+                if created_id not in found:
+                    found.append(created_id)
+                if found[0] != created_id:
+                    self.delete_files(created_id)
+
+            self.folders[key] = found[0]
+            return found[0]
+
+
+    def ensure_path(self, folder_path: AnyStr, root_folder_id: AnyStr = None) -> AnyStr:
+        """
+        Returns the ID of the folder at a path, creating the missing folders along the way.
+        Every folder of the path is resolved once and then cached, so the folders of a whole batch of uploads
+        are looked up only once. A path found in the cache costs one call to check its last folder still exists;
+        when a cached folder was deleted or trashed in Drive meanwhile, the cache is cleared and the path is
+        resolved again.
+        Args:
+            folder_path (AnyStr): The path of the folder, e.g. 'Invoices/2026/10/Argenta'.
+            root_folder_id (AnyStr, optional): The ID of the folder the path starts in. Defaults to the root directory.
+        Returns:
+            AnyStr: The ID of the last folder of the path.
+        Example:
+            >>> folder_id = gdrive.ensure_path("Invoices/2026/10/Argenta")
+            >>> gdrive.upload_file("files/invoices/I_2026-10.pdf", folder_id)
+        """
+
+        names = [name for name in folder_path.split("/") if name]
+
+        for attempt in range(2):
+            folder_id = root_folder_id
+            cached = True
+            try:
+                for name in names:
+                    cached = cached and (folder_id or "root", name) in self.folders
+                    folder_id = self.ensure_folder(name, folder_id)
+            except HttpError as e:
+                if e.resp.status != 404 or attempt > 0:
+                    raise
+                self.forget_folders()
+                continue
+
+            # only a path that was looked up in Drive is known to exist, a folder in a trashed folder is trashed too
+            if not cached or not names or attempt > 0 or self.__folder_exists(folder_id):
+                return folder_id
+            self.forget_folders()
+
+
+    def __folder_exists(self, folder_id: AnyStr) -> bool:
+        try:
+            # pylint: disable=E1101
+            folder = self.service.files().get(fileId=folder_id, fields="id, trashed").execute()
+        except HttpError as e:
+            if e.resp.status != 404:
+                raise
+            return False
+        return not folder.get("trashed")
+
+
+    def forget_folders(self, folder_id: AnyStr = None) -> None:
+        """
+        Clears the folder cache, e.g. after folders were moved or deleted outside of this client.
+        Args:
+            folder_id (AnyStr, optional): Forget only this folder and its children. Defaults to all folders.
+        """
+
+        with self.folders_lock:
+            if folder_id is None:
+                self.folders.clear()
+                return
+            for key, cached_id in list(self.folders.items()):
+                if cached_id == folder_id or key[0] == folder_id:
+                    del self.folders[key]
+
+
+    def iter_folder(self, parent_folder_id=None, fields: AnyStr = LIST_FIELDS) -> Iterator[dict]:
+        """
+        Lists the contents of a specified Google Drive folder, following every page.
+        Args:
+            parent_folder_id (str, optional): The ID of the parent folder to list contents from. 
+                                              If None, lists from the root directory. Defaults to None.
+            fields (AnyStr, optional): The file fields to request. Defaults to LIST_FIELDS.
+        Yields:
+            dict: The requested fields of every file in the folder.
+        """
+
+        return self.iter_files(
+            f"'{parent_folder_id}' in parents and trashed=false" if parent_folder_id else None,
+            fields
+        )
+
+
+    def list_folder(self, parent_folder_id=None, delete=False, fields: AnyStr = LIST_FIELDS) -> List[dict]:
         """
         Lists the contents of a specified Google Drive folder.
         Args:
             parent_folder_id (str, optional): The ID of the parent folder to list contents from. 
                                               If None, lists from the root directory. Defaults to None.
             delete (bool, optional): If True, deletes the files after listing them. Defaults to False.
+            fields (AnyStr, optional): The file fields to request. Defaults to LIST_FIELDS.
         Returns:
             List[dict]: A list of dictionaries containing file information such as 'id', 'name', and 'mimeType'.
         """
         
-        
-        # list the contents of the specified folder
-        results = self.service.files().list(
-            q=f"'{parent_folder_id}' in parents and trashed=false" if parent_folder_id else None,
-            pageSize=1000,
-            fields="nextPageToken, files(id, name, mimeType)"
-        ).execute()
-
-        # get the items from the results
-        items = results.get('files', [])
+        # list every page of the specified folder
+        items = list(self.iter_folder(parent_folder_id, fields))
 
         return items
 
@@ -152,39 +335,169 @@ class GDrive():
             print(f"Error details: {str(e)}")
 
 
-    def download_file(self, file_id, destination_path):
+    def __fetch_range(self, request, offset: int, chunk_size: int):
+        # one ranged GET on the media url; the authorized http of the request adds the credentials
+        def fetch():
+            resp, content = request.http.request(
+                request.uri,
+                method="GET",
+                headers={"range": f"bytes={offset}-{offset + chunk_size - 1}"}
+            )
+            if resp.status not in (200, 206):
+                raise HttpError(resp, content, uri=request.uri)
+            return resp, content
+
+        return self.clients.limiter.call(fetch, self.clients.limiter.cost(request.methodId))
+
+
+    def download_file(self, file_id, destination_path, chunk_size: int = DOWNLOAD_CHUNK_SIZE, md5: AnyStr = None, size: int = None):
         """
         Downloads a file from Google Drive to a specified local destination.
+        The download is skipped when the destination already has the same md5 as the file in Drive.
+        Otherwise the file is fetched in ranged chunks into a '.part' file next to the destination, which
+        replaces the destination once it is complete and its md5 checks out. When a download is interrupted,
+        the next call continues from the bytes already in the '.part' file.
         Args:
             file_id (str): The ID of the file to be downloaded from Google Drive.
             destination_path (str): The local file path where the downloaded file will be saved.
+            chunk_size (int, optional): The size of the chunks. Defaults to DOWNLOAD_CHUNK_SIZE.
+            md5 (AnyStr, optional): The md5Checksum of the file, when the caller already listed it.
+            size (int, optional): The size of the file, when the caller already listed it.
         Returns:
-            None
+            bool: True when the file was downloaded, False when the destination was already up to date.
         Raises:
             googleapiclient.errors.HttpError: If an error occurs during the download process.
+            Exception: If the downloaded file does not match the md5 of the file in Drive.
         """
-        
+
+        # the checksum and size are needed to skip and to resume
+        if md5 is None or size is None:
+            metadata = self.service.files().get(fileId=file_id, fields="md5Checksum, size").execute()
+            md5 = metadata.get("md5Checksum")
+            size = int(metadata["size"]) if "size" in metadata else None
+
+        if md5 is not None and os.path.exists(destination_path) and file_md5(destination_path) == md5:
+            return False
+
         # request the file from Google Drive
         request = self.service.files().get_media(fileId=file_id)
-        fh = io.FileIO(destination_path, mode='wb')
-        
-        # create a file downloader
-        downloader = MediaIoBaseDownload(fh, request)
-        
-        # download the file in chunks
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
-            print(f"Download {int(status.progress() * 100)}%.")
-    
+        part_path = destination_path + ".part"
+
+        # download the file in chunks, continuing a previous partial download
+        with open(part_path, "ab") as fh:
+            offset = fh.tell()
+            if size is not None and offset > size:
+                fh.truncate(0)
+                offset = 0
+
+            while size is None or offset < size:
+                resp, content = self.__fetch_range(request, offset, chunk_size)
+
+                # the whole file came back instead of the range
+                if resp.status == 200:
+                    fh.seek(0)
+                    fh.truncate()
+                    fh.write(content)
+                    break
+
+                fh.write(content)
+                offset += len(content)
+
+                total = resp.get("content-range", "").rpartition("/")[2]
+                if size is None and total.isdigit():
+                    size = int(total)
+                if not content or size is None:
+                    break
+
+        if md5 is not None and file_md5(part_path) != md5:
+            # a partial download of an older version of the file; the next call starts over
+            os.remove(part_path)
+            raise Exception(f"Download of {file_id} does not match its md5 in Drive")
+
+        os.replace(part_path, destination_path)
+        print(f"Downloaded {file_id} to {destination_path}")
+        return True
+
 
-    def upload_file(self, file_path, parent_folder_id=None):
+    def download_many(self,
+                      files: List[Dict],
+                      workers: int = DOWNLOAD_WORKERS,
+                      chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> List[Dict]:
+        """
+        Downloads many files from Google Drive at the same time, each with download_file.
+        Files whose destination already has the same md5 are skipped.
+        Args:
+            files (List[Dict]): The files with the keys 'id' and 'path', the local destination, and optionally
+                                'md5Checksum' and 'size' as listed from Drive, which saves a request per file.
+            workers (int, optional): The number of files downloaded at the same time. Defaults to DOWNLOAD_WORKERS.
+            chunk_size (int, optional): The size of the chunks. Defaults to DOWNLOAD_CHUNK_SIZE.
+        Returns:
+            List[Dict]: One result per file, in input order, with the keys 'id', 'path', 'downloaded'
+                        and 'error' (None on success).
+        """
+
+        def download(file):
+            size = file.get("size")
+            try:
+                downloaded = self.download_file(
+                    file["id"], file["path"], chunk_size, file.get("md5Checksum"), int(size) if size is not None else None
+                )
+                return {"id": file["id"], "path": file["path"], "downloaded": downloaded, "error": None}
+            except Exception as e:
+                print(f"An error occurred: {e}")
+                return {"id": file["id"], "path": file["path"], "downloaded": False, "error": e}
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(download, files))
+
+
+    def download_folder(self,
+                        parent_folder_id: AnyStr,
+                        local_dir: AnyStr,
+                        workers: int = DOWNLOAD_WORKERS,
+                        chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> List[Dict]:
+        """
+        Downloads a Drive folder and its subfolders into a local directory, e.g. to restore the invoice archive.
+        Files that are already up to date locally are skipped.
+        Args:
+            parent_folder_id (AnyStr): The ID of the Drive folder.
+            local_dir (AnyStr): The directory to download into, created when missing.
+            workers (int, optional): The number of files downloaded at the same time. Defaults to DOWNLOAD_WORKERS.
+            chunk_size (int, optional): The size of the chunks. Defaults to DOWNLOAD_CHUNK_SIZE.
+        Returns:
+            List[Dict]: The results of download_many.
+        Example:
+            >>> gdrive.download_folder(Config.DIR_ID_ARGENTA, Config.PATH_OUT)
+        """
+
+        files = []
+        folders = [(parent_folder_id, local_dir)]
+        while folders:
+            folder_id, folder_dir = folders.pop()
+            os.makedirs(folder_dir, exist_ok=True)
+            for file in self.iter_folder(folder_id, "id, name, mimeType, md5Checksum, size"):
+                path = os.path.join(folder_dir, file["name"])
+                if file["mimeType"] == FOLDER_MIME_TYPE:
+                    folders.append((file["id"], path))
+                elif "md5Checksum" in file:
+                    # Google Docs have no content to download
+                    files.append({**file, "path": path})
+
+        return self.download_many(files, workers, chunk_size)
+
+
+    def upload_file(self, file_path, parent_folder_id=None, chunk_size: int = UPLOAD_CHUNK_SIZE, file_id: AnyStr = None):
         """
         Uploads a file to Google Drive.
+        The file is uploaded in resumable chunks; after a dropped connection or a server error the upload
+        resumes from the last chunk the server received instead of starting over.
         Args:
             file_path (str): The path to the file to be uploaded.
             parent_folder_id (str, optional): The ID of the parent folder in Google Drive where the file will be uploaded. 
                                               If not provided, the file will be uploaded to the root directory.
+            chunk_size (int, optional): The size of the chunks, a multiple of 256 KB. Defaults to UPLOAD_CHUNK_SIZE.
+            file_id (AnyStr, optional): The ID of an existing file whose content is replaced, keeping its ID.
+                                        The parent folder is then ignored. Defaults to creating a new file.
         Returns:
             str: The ID of the uploaded file.
         Raises:
@@ -200,15 +513,66 @@ class GDrive():
             'parents': [parent_folder_id] if parent_folder_id else []
         }
 
-        # create an uploader for the file
-        media = MediaFileUpload(file_path, mimetype='application/pdf')
+        # the mime type follows from the file's extension
+        mimetype, _ = mimetypes.guess_type(file_path)
+
+        # create a resumable uploader for the file
+        media = MediaFileUpload(
+            file_path,
+            mimetype=mimetype or 'application/octet-stream',
+            chunksize=chunk_size,
+            resumable=True
+        )
         
-        # upload the file to Google Drive
-        uploaded_file = self.service.files().create(
-            body=file_metadata,
-            media_body=media,
-            fields='id'
-        ).execute()
+        # upload the file to Google Drive, chunk by chunk
+        if file_id is None:
+            request = self.service.files().create(
+                body=file_metadata,
+                media_body=media,
+                fields='id'
+            )
+        else:
+            request = self.service.files().update(
+                fileId=file_id,
+                media_body=media,
+                fields='id'
+            )
+
+        # a chunk that fails is resumed by the rate limiter from where the server stopped
+        uploaded_file = None
+        while uploaded_file is None:
+            _, uploaded_file = request.next_chunk()
         
         print(f'Uploaded File ID: {uploaded_file["id"]}')
         return uploaded_file["id"]
+
+
+    def upload_many(self,
+                    file_paths: List[AnyStr],
+                    parent_folder_id: AnyStr = None,
+                    workers: int = UPLOAD_WORKERS,
+                    chunk_size: int = UPLOAD_CHUNK_SIZE) -> List[Dict]:
+        """
+        Uploads many files to Google Drive at the same time, each with upload_file.
+        Every worker thread uses its own connection.
+        Args:
+            file_paths (List[AnyStr]): The paths of the files to be uploaded.
+            parent_folder_id (AnyStr, optional): The ID of the parent folder in Google Drive. Defaults to the root directory.
+            workers (int, optional): The number of files uploaded at the same time. Defaults to UPLOAD_WORKERS.
+            chunk_size (int, optional): The size of the chunks, a multiple of 256 KB. Defaults to UPLOAD_CHUNK_SIZE.
+        Returns:
+            List[Dict]: One result per file, in input order, with the keys 'path', 'id' (None on failure)
+                        and 'error' (None on success).
+        Example:
+            >>> gdrive.upload_many(glob.glob('files/invoices/I_2024-*'), Config.DIR_ID_ARGENTA)
+        """
+
+        def upload(file_path):
+            try:
+                return {"path": file_path, "id": self.upload_file(file_path, parent_folder_id, chunk_size), "error": None}
+            except Exception as e:
+                print(f"An error occurred: {e}")
+                return {"path": file_path, "id": None, "error": e}
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(upload, file_paths))
@@ -1,8 +1,11 @@
 import os.path
 import base64
 import mimetypes
-from typing import AnyStr, Dict, List, Union
+import tempfile
+import uuid
+from typing import AnyStr, BinaryIO, Callable, Dict, List, Union
 
+from email import encoders, policy
 from email.message import EmailMessage
 from email.mime.audio import MIMEAudio
 from email.mime.base import MIMEBase
@@ -10,13 +13,27 @@ from email.mime.image import MIMEImage
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseUpload
 
 from config import Config
+from gauth import credentials, client_pool
+from ratelimit import TRANSPORT_ERRORS
+
+
+# Gmail accepts up to 100 calls per batch, but larger batches are rate limited; 50 is the advised size
+BATCH_SIZE = 50
+
+# messages with attachments are uploaded as raw RFC822 through the media endpoint,
+# in resumable chunks once they are larger than the threshold
+RESUMABLE_THRESHOLD = 5 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+
+# attachments are base64 encoded in blocks of whole 76 character lines
+ENCODE_BLOCK_SIZE = 57 * 1024
+
+# the message file is kept in memory up to this size, and spooled to disk above it
+SPOOL_SIZE = 1024 * 1024
 
 
 class Gmail:
@@ -34,38 +51,22 @@ class Gmail:
             HttpError: If an error occurs while building the Google Drive service.
         """
 
-        self.creds = None
-        self.service = None
+        # the credentials are loaded once per token file and shared with the other clients
+        provider = credentials(secret_file, token_file)
+        self.creds = provider.get()
 
-        # Load the credentials from the token file if it exists
-        if os.path.exists(token_file):
-            self.creds = Credentials.from_authorized_user_file(token_file, Config.APP_SCOPES)
-        
-        # If there are no (valid) credentials available, let the user log in.
-        if not self.creds or not self.creds.valid:
+        # every thread gets its own client from the pool
+        self.clients = client_pool(provider, "gmail", "v1")
 
-            # Refresh the credentials if they are expired
-            if self.creds and self.creds.expired and self.creds.refresh_token:
-                self.creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    secret_file, Config.APP_SCOPES
-                )
-                self.creds = flow.run_local_server(port=0)
-            
-            # Save the credentials for the next run
-            with open(token_file, "w") as token:
-                token.write(self.creds.to_json())
-        
-        try:
 
-            # Build the Google Drive service
-            self.service = build("gmail", "v1", credentials=self.creds)
+    @property
+    def service(self):
+        """
+        The Gmail service instance of the calling thread.
+        """
+
+        return self.clients.get()
 
-        except HttpError as error:
-            # TODO(developer) - Handle errors from drive API.
-            print(f"An error occurred: {error}")
-    
 
     def __build_file_part(self, file):
         """Creates a MIME part for a file.
@@ -86,18 +87,25 @@ class Gmail:
             content_type = "application/octet-stream"
         main_type, sub_type = content_type.split("/", 1)
         if main_type == "text":
-            with open(file, "rb"):
-                msg = MIMEText("r", _subtype=sub_type)
+            with open(file, "rb") as f:
+                content = f.read()
+            try:
+                msg = MIMEText(content.decode("utf-8"), _subtype=sub_type, _charset="utf-8")
+            except UnicodeDecodeError:
+                msg = MIMEBase(main_type, sub_type)
+                msg.set_payload(content)
+                encoders.encode_base64(msg)
         elif main_type == "image":
-            with open(file, "rb"):
-                msg = MIMEImage("r", _subtype=sub_type)
+            with open(file, "rb") as f:
+                msg = MIMEImage(f.read(), _subtype=sub_type)
         elif main_type == "audio":
-            with open(file, "rb"):
-                msg = MIMEAudio("r", _subtype=sub_type)
+            with open(file, "rb") as f:
+                msg = MIMEAudio(f.read(), _subtype=sub_type)
         else:
             with open(file, "rb") as f:
                 msg = MIMEBase(main_type, sub_type)
                 msg.set_payload(f.read())
+            encoders.encode_base64(msg)
         filename = os.path.basename(file)
         msg.add_header("Content-Disposition", "attachment", filename=filename)
         return msg
@@ -125,13 +133,7 @@ class Gmail:
                 message.attach(MIMEText(message_text, 'plain'))
 
                 for attachment in attachments:
-                    # guessing the MIME type
-                    type_subtype, _ = mimetypes.guess_type(attachment)
-                    maintype, subtype = type_subtype.split("/")
-
-                    attachment_data = self.__build_file_part(attachment)
-
-                    message.add_attachment(attachment_data, maintype, subtype)
+                    message.attach(self.__build_file_part(attachment))
             else:
                 message = EmailMessage()
 
@@ -153,13 +155,110 @@ class Gmail:
         return None
 
 
+    def __write_message(self, to: AnyStr, subject: AnyStr, message_text: AnyStr, attachments: List[AnyStr]) -> BinaryIO:
+        """
+        Writes an email message with attachments as RFC822 to a temporary file. The attachments are
+        streamed from disk and base64 encoded block by block, so they are never in memory as a whole.
+        Args:
+            to (AnyStr): The recipient's email address.
+            subject (AnyStr): The subject of the email.
+            message_text (AnyStr): The body text of the email.
+            attachments (List[AnyStr]): The file paths to attach to the email.
+        Returns:
+            BinaryIO: The message file, positioned at its start.
+        """
+
+        boundary = f"=============={uuid.uuid4().hex}=="
+
+        headers = EmailMessage(policy=policy.SMTP)
+        headers["MIME-Version"] = "1.0"
+        headers["To"] = to
+        headers["From"] = Config.FROM_ADDRESS
+        headers["Subject"] = subject
+        headers["Content-Type"] = "multipart/mixed"
+        headers.set_param("boundary", boundary)
+
+        def write_headers(headers: EmailMessage) -> None:
+            # only the headers, the bodies are written separately
+            for name, value in headers.items():
+                message.write(policy.SMTP.fold_binary(name, value))
+            message.write(b"\r\n")
+
+        message = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        write_headers(headers)
+
+        message.write(f"--{boundary}\r\n".encode())
+        message.write(MIMEText(message_text, "plain", "utf-8").as_bytes(policy=policy.SMTP))
+
+        for attachment in attachments:
+            content_type, encoding = mimetypes.guess_type(attachment)
+            if content_type is None or encoding is not None:
+                content_type = "application/octet-stream"
+
+            # the part's headers, its body is written below
+            part = EmailMessage(policy=policy.SMTP)
+            part["Content-Type"] = content_type
+            part.add_header("Content-Disposition", "attachment", filename=os.path.basename(attachment))
+            part["Content-Transfer-Encoding"] = "base64"
+
+            message.write(f"\r\n--{boundary}\r\n".encode())
+            write_headers(part)
+
+            with open(attachment, "rb") as f:
+                for block in iter(lambda: f.read(ENCODE_BLOCK_SIZE), b""):
+                    message.write(base64.encodebytes(block).replace(b"\n", b"\r\n"))
+
+        message.write(f"\r\n--{boundary}--\r\n".encode())
+        message.seek(0)
+        return message
+
+
+    def __upload_message(self, method: Callable, to: AnyStr, subject: AnyStr, message_text: AnyStr, attachments: List[AnyStr]) -> dict:
+        """
+        Uploads an email message with attachments as raw RFC822 through the media endpoint of method,
+        instead of base64 encoding it into a json body. Large messages are uploaded in resumable chunks.
+        Args:
+            method (Callable): The api method, messages().send or drafts().create.
+            to (AnyStr): The recipient's email address.
+            subject (AnyStr): The subject of the email.
+            message_text (AnyStr): The body text of the email.
+            attachments (List[AnyStr]): The file paths to attach to the email.
+        Returns:
+            dict: The response of the api method.
+        Raises:
+            HttpError: If the upload fails.
+        """
+
+        with self.__write_message(to, subject, message_text, attachments) as message:
+            size = message.seek(0, os.SEEK_END)
+            message.seek(0)
+
+            media = MediaIoBaseUpload(
+                message,
+                mimetype="message/rfc822",
+                chunksize=UPLOAD_CHUNK_SIZE,
+                resumable=size > RESUMABLE_THRESHOLD
+            )
+            request = method(userId="me", media_body=media)
+
+            if not media.resumable():
+                return request.execute()
+
+            response = None
+            while response is None:
+                _, response = request.next_chunk()
+            return response
+
+
     def create_draft(self, to: AnyStr, subject: AnyStr, message_text: AnyStr, attachments: List[AnyStr] = None) -> dict:
         """
         Creates a draft email with the specified recipient, subject, and message text.
+        A draft with attachments is streamed from disk through the media upload endpoint.
         Args:
             to (AnyStr): The recipient's email address.
             subject (AnyStr): The subject of the email.
             message_text (AnyStr): The body text of the email.
+            attachments (List[AnyStr], optional): A list of file paths to attach to the email. Defaults to None.
         Returns:
             dict: The created draft's metadata, including its ID and message content, or None if an error occurred.
         Raises:
@@ -167,6 +266,12 @@ class Gmail:
         """
 
         try:
+            if attachments:
+                # pylint: disable=E1101
+                draft = self.__upload_message(self.service.users().drafts().create, to, subject, message_text, attachments)
+                print(f'Draft id: {draft["id"]}\nDraft message: {draft["message"]}')
+                return draft
+
             body = self.__compose_message(to, subject, message_text, attachments)
 
             # pylint: disable=E1101
@@ -186,6 +291,7 @@ class Gmail:
     def send_message(self, to: AnyStr, subject: AnyStr, message_text: AnyStr, attachments: List[AnyStr] = None) -> dict:
         """Create and send an email message
         Print the returned  message id
+        A message with attachments is streamed from disk through the media upload endpoint.
         Returns: Message object, including message id
 
         Load pre-authorized user credentials from the environment.
@@ -194,6 +300,12 @@ class Gmail:
         """
 
         try:
+            if attachments:
+                # pylint: disable=E1101
+                send_message = self.__upload_message(self.service.users().messages().send, to, subject, message_text, attachments)
+                print(f'Message Id: {send_message["id"]}')
+                return send_message
+
             body = self.__compose_message(to, subject, message_text, attachments)
 
             # pylint: disable=E1101
@@ -235,6 +347,124 @@ class Gmail:
         return send_draft
 
 
+    def __execute_batch(self, requests: List, batch_size: int = BATCH_SIZE) -> List[Dict]:
+        """
+        Executes requests in batches of at most batch_size calls, one HTTP round trip per batch.
+        Args:
+            requests (List): The requests to execute, None for a request that could not be built.
+            batch_size (int, optional): The number of calls per batch. Defaults to BATCH_SIZE.
+        Returns:
+            List[Dict]: One result per request, in request order, with the keys 'result' (the response,
+                        or None on failure) and 'error' (None on success). A batch that fails as a whole,
+                        e.g. on a dropped connection, fails every call in it without an answer; the other
+                        batches are still sent, so the results of every batch are returned.
+        """
+
+        results = [{"result": None, "error": None} for _ in requests]
+
+        def callback(request_id, response, exception):
+            results[int(request_id)]["result"] = response
+            results[int(request_id)]["error"] = exception
+
+        limiter = self.clients.limiter
+        for start in range(0, len(requests), batch_size):
+            pending = []
+            for i in range(start, min(start + batch_size, len(requests))):
+                if requests[i] is None:
+                    results[i]["error"] = Exception("Could not compose the message")
+                else:
+                    pending.append(i)
+
+            attempt = 0
+            while pending:
+                # pylint: disable=E1101
+                batch = self.service.new_batch_http_request(callback=callback)
+                for i in pending:
+                    results[i] = {"result": None, "error": None}
+                    batch.add(requests[i], request_id=str(i))
+
+                # the calls of a batch count against the quota one by one
+                for i in pending:
+                    limiter.acquire(limiter.cost(requests[i].methodId))
+                try:
+                    batch.execute()
+                except (HttpError, *TRANSPORT_ERRORS) as error:
+                    # a call without an answer may still have been carried out, so it is not sent again
+                    print(f"An error occurred: {error}")
+                    for i in pending:
+                        if results[i]["result"] is None and results[i]["error"] is None:
+                            results[i]["error"] = error
+                    break
+
+                # calls that were throttled, or reads that hit a server error, are sent again in a new batch
+                delays = {
+                    i: limiter.retry_delay(results[i]["error"], attempt, idempotent=requests[i].method == "GET")
+                    for i in pending if results[i]["error"] is not None
+                }
+                pending = [i for i, delay in delays.items() if delay is not None]
+                if pending:
+                    limiter.backoff(results[pending[0]]["error"], max(delays[i] for i in pending))
+                    attempt += 1
+
+        return results
+
+
+    def create_drafts(self, messages: List[Dict], batch_size: int = BATCH_SIZE) -> List[Dict]:
+        """
+        Creates many drafts with batched requests.
+        Args:
+            messages (List[Dict]): The messages, each with the keys 'to', 'subject', 'message_text'
+                                   and optionally 'attachments', as passed to create_draft.
+            batch_size (int, optional): The number of calls per batch. Defaults to BATCH_SIZE.
+        Returns:
+            List[Dict]: Per message, the created draft under 'result' and the error, if any, under 'error'.
+        """
+
+        requests = []
+        for message in messages:
+            body = self.__compose_message(**message)
+            # pylint: disable=E1101
+            requests.append(self.service.users().drafts().create(userId="me", body=body) if body else None)
+
+        return self.__execute_batch(requests, batch_size)
+
+
+    def send_messages(self, messages: List[Dict], batch_size: int = BATCH_SIZE) -> List[Dict]:
+        """
+        Sends many messages with batched requests.
+        Args:
+            messages (List[Dict]): The messages, each with the keys 'to', 'subject', 'message_text'
+                                   and optionally 'attachments', as passed to send_message.
+            batch_size (int, optional): The number of calls per batch. Defaults to BATCH_SIZE.
+        Returns:
+            List[Dict]: Per message, the sent message under 'result' and the error, if any, under 'error'.
+        """
+
+        requests = []
+        for message in messages:
+            body = self.__compose_message(**message)
+            # pylint: disable=E1101
+            requests.append(self.service.users().messages().send(userId="me", body=body) if body else None)
+
+        return self.__execute_batch(requests, batch_size)
+
+
+    def send_drafts(self, draft_ids: List[AnyStr], batch_size: int = BATCH_SIZE) -> List[Dict]:
+        """
+        Sends many drafts by their IDs with batched requests.
+        Args:
+            draft_ids (List[AnyStr]): The IDs of the drafts to send.
+            batch_size (int, optional): The number of calls per batch. Defaults to BATCH_SIZE.
+        Returns:
+            List[Dict]: Per draft, the sent message under 'result' and the error, if any, under 'error'.
+        """
+
+        # pylint: disable=E1101
+        requests = [self.service.users().drafts().send(userId="me", body={"id": draft_id}) for draft_id in draft_ids]
+
+        return self.__execute_batch(requests, batch_size)
+
+
     def bla(self, string: str) -> dict:
         return self.__build_file_part(string)
 
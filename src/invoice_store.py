@@ -0,0 +1,654 @@
+import fcntl
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+from typing import AnyStr, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from enumerations import DocumentType
+from sqlite_db import SqliteDb, Transaction
+
+
+# bytes read at a time when looking for the last line of the journal
+JOURNAL_BLOCK_SIZE = 64 * 1024
+
+
+def seq_id(doc_type: DocumentType) -> AnyStr:
+    """
+    The key of a document type in a company's last_sequences.
+    """
+
+    return "offer" if doc_type == DocumentType.OFFER else "invoice"
+
+
+def invoice_key(record: Dict) -> Tuple[AnyStr, AnyStr, AnyStr]:
+    """
+    The key of an issued document. Numbers are counted per creditor and document type,
+    so the number alone is not unique.
+    """
+
+    return (record["creditor_id"], record["doc_type"], record["doc_nr"])
+
+
+def release_numbers(last_seq: int, voided: Iterable[int], numbers: Iterable[int]) -> Tuple[int, List[int]]:
+    """
+    Returns numbers that were not issued to a sequence. Invoices are numbered in chronological order,
+    so a number is only handed out again when no higher number was issued: numbers at the end of the
+    sequence lower the last sequence, the others are voided and never handed out again.
+    A voided number that ends up at the end of the sequence, because every number after it was returned
+    as well, lowers the last sequence too.
+    Args:
+        last_seq (int): The current last sequence.
+        voided (Iterable[int]): The numbers voided earlier.
+        numbers (Iterable[int]): The numbers to return.
+    Returns:
+        Tuple[int, List[int]]: The new last sequence and the sorted voided numbers.
+    Example:
+        >>> release_numbers(10, [], [7, 9, 10])
+        (8, [7])
+    """
+
+    free = set(voided) | set(numbers)
+    while last_seq in free:
+        free.remove(last_seq)
+        last_seq -= 1
+    return last_seq, sorted(n for n in free if n <= last_seq)
+
+
+def is_record(line: bytes) -> bool:
+    """
+    Whether a line of the journal is complete: a json record ending in a newline.
+    """
+
+    if not line.endswith(b"\n"):
+        return False
+    try:
+        json.loads(line)
+    except ValueError:
+        return False
+    return True
+
+
+class _FileLock:
+
+    def __init__(self, path: AnyStr):
+        # an advisory lock next to the db, held across processes
+        self.path = path
+        self.fd = None
+
+
+    def __enter__(self):
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+
+    def __exit__(self, *args):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
+        self.fd = None
+
+
+class JsonStore:
+
+    def __init__(self, path: AnyStr):
+        """
+        The db as a single json file, the original format.
+        Every write rewrites the whole file, but through a temporary file and an atomic rename,
+        so a crash during the write leaves the previous version intact. Writes are serialized
+        across processes with a lock file next to the db.
+        Issued documents are not part of the reference data: they are appended to a journal next to
+        the db, one json line per document, so saving one costs the same however many exist.
+        The sequences are kept in a small file of their own next to the db, so reserving a number neither
+        rewrites the db nor changes its version. The last_sequences in the db only seed that file.
+        Args:
+            path (AnyStr): Path to the json file.
+        """
+
+        self.path = path
+        self.journal_path = os.path.splitext(path)[0] + ".invoices.jsonl"
+        self.sequences_path = os.path.splitext(path)[0] + ".sequences.json"
+        self.lock = threading.Lock()
+
+
+    def __read(self) -> Dict:
+        with open(self.path, "r") as f:
+            return json.load(f)
+
+
+    def load(self) -> Dict:
+        """
+        Loads the reference data. Sequences and issued documents are not loaded,
+        use last_sequence, get_invoice and find_invoices for those.
+        """
+
+        db = self.__read()
+        for company in db.get("companies", {}).values():
+            company.pop("last_sequences", None)
+        db.pop("released_sequences", None)
+        db.pop("voided_sequences", None)
+        db["invoices"] = {}
+        return db
+
+
+    def version(self) -> Tuple[int, int]:
+        """
+        Changes whenever the file is written: its modification time and size.
+        """
+
+        stat = os.stat(self.path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+
+    def __locked(self) -> _FileLock:
+        return _FileLock(self.path + ".lock")
+
+
+    def __write(self, db: Dict, path: AnyStr = None) -> None:
+        path = path or self.path
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".db-", suffix=".json")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(json.dumps(db, sort_keys=True, indent=4))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+
+    def save(self, db: Dict) -> None:
+        """
+        Replaces the reference data with the given db. The sequences are owned by the store and kept
+        as they are on disk, as are the last_sequences that seed them. Issued documents still kept in the db by older versions move to the journal.
+        """
+
+        with self.lock, self.__locked():
+            current = self.__read()
+            if current.get("invoices"):
+                self.__append(current["invoices"].values())
+            companies = {}
+            for company_id, company in db.get("companies", {}).items():
+                company = dict(company)
+                if "last_sequences" in current["companies"].get(company_id, {}):
+                    company["last_sequences"] = current["companies"][company_id]["last_sequences"]
+                companies[company_id] = company
+
+            self.__write(dict(
+                db,
+                companies=companies,
+                invoices={},
+                released_sequences=current.get("released_sequences", {}),
+            ))
+
+
+    def __sequences(self) -> Dict:
+        if not os.path.exists(self.sequences_path):
+            return {"last_sequences": {}, "voided_sequences": {}}
+        with open(self.sequences_path, "r") as f:
+            state = json.load(f)
+        # older versions handed released numbers out again, out of order; they are voided now
+        if "released_sequences" in state:
+            state["voided_sequences"] = state.pop("released_sequences")
+        return state
+
+
+    def __sequence(self, state: Dict, creditor_id: AnyStr, sid: AnyStr) -> Tuple[Dict, Dict]:
+        # the sequences of a creditor start from the db the first time they are used
+        last_sequences = state["last_sequences"].setdefault(creditor_id, {})
+        voided = state["voided_sequences"].setdefault(creditor_id, {})
+        if sid not in last_sequences:
+            db = self.__read()
+            last_sequences[sid] = db["companies"][creditor_id].get("last_sequences", {}).get(sid, 0)
+            voided[sid] = db.get("released_sequences", {}).get(creditor_id, {}).get(sid, [])
+        return last_sequences, voided
+
+
+    def sequences(self) -> Dict:
+        """
+        Returns the state of every sequence, with the keys 'last_sequences' and 'voided_sequences',
+        both by creditor and sequence.
+        """
+
+        with self.lock, self.__locked():
+            state = self.__sequences()
+            db = self.__read()
+            for creditor_id, company in db.get("companies", {}).items():
+                for sid in company.get("last_sequences", {}):
+                    self.__sequence(state, creditor_id, sid)
+            return state
+
+
+    def last_sequence(self, creditor_id: AnyStr, doc_type: DocumentType) -> int:
+        """
+        Returns the last number issued, or reserved, in the creditor's sequence.
+        """
+
+        sid = seq_id(doc_type)
+        last_sequences, _ = self.__sequence(self.__sequences(), creditor_id, sid)
+        return last_sequences[sid]
+
+
+    def reserve_sequence(self, creditor_id: AnyStr, doc_type: DocumentType, count: int = 1) -> List[int]:
+        """
+        Reserves the next count numbers of the creditor's sequence.
+        """
+
+        sid = seq_id(doc_type)
+        with self.lock, self.__locked():
+            state = self.__sequences()
+            last_sequences, _ = self.__sequence(state, creditor_id, sid)
+
+            last_seq = last_sequences[sid]
+            last_sequences[sid] = last_seq + count
+
+            self.__write(state, self.sequences_path)
+        return list(range(last_seq + 1, last_seq + 1 + count))
+
+
+    def release_sequence(self, creditor_id: AnyStr, doc_type: DocumentType, numbers: Iterable[int]) -> None:
+        """
+        Returns reserved numbers that were not used. See release_numbers.
+        """
+
+        sid = seq_id(doc_type)
+        with self.lock, self.__locked():
+            state = self.__sequences()
+            last_sequences, voided = self.__sequence(state, creditor_id, sid)
+
+            last_sequences[sid], voided[sid] = release_numbers(last_sequences[sid], voided.get(sid, []), numbers)
+
+            self.__write(state, self.sequences_path)
+
+
+    def commit_invoice(self, doc_type: DocumentType, record: Dict) -> None:
+        """
+        Stores an issued document. Its number is reserved beforehand with reserve_sequence.
+        """
+
+        self.commit_batch(doc_type, [record])
+
+
+    def __last_line(self, f) -> Tuple[int, bytes]:
+        # the offset and content of the last line of the journal, read backwards so appending stays cheap
+        end = f.seek(0, os.SEEK_END)
+        start = pos = max(0, end - 1)
+        while pos > 0:
+            step = min(JOURNAL_BLOCK_SIZE, pos)
+            f.seek(pos - step)
+            newline = f.read(step).rfind(b"\n")
+            if newline >= 0:
+                start = pos - step + newline + 1
+                break
+            pos -= step
+        else:
+            start = 0
+        f.seek(start)
+        return start, f.read(end - start)
+
+
+    def __append(self, records: Iterable[Dict]) -> None:
+        lines = "".join(json.dumps(record, sort_keys=True) + "\n" for record in records)
+        with open(self.journal_path, "a+b") as f:
+            # a crash or a full disk during the previous append can leave half a line behind, which is dropped
+            start, last_line = self.__last_line(f)
+            if last_line and not is_record(last_line):
+                f.truncate(start)
+            f.write(lines.encode())
+            f.flush()
+            os.fsync(f.fileno())
+
+
+    def commit_batch(self, doc_type: DocumentType, records: List[Dict]) -> None:
+        """
+        Stores the issued documents, appended to the journal in one write. Records are never replaced:
+        a document committed twice is kept twice.
+        """
+
+        with self.lock, self.__locked():
+            self.__append(dict(record, doc_type=doc_type.value) for record in records)
+
+
+    def invoices(self) -> Iterator[Dict]:
+        """
+        Reads every issued document, in the order they were committed.
+        A torn last line, left by a crash during an append, is skipped; it is dropped by the next append.
+        Raises:
+            Exception: If a line before the last one is not a valid record.
+        """
+
+        # documents of older versions were kept in the db itself
+        yield from self.__read().get("invoices", {}).values()
+
+        if not os.path.exists(self.journal_path):
+            return
+
+        with open(self.journal_path, "rb") as f:
+            torn = None
+            for nr, line in enumerate(f, 1):
+                if torn is not None:
+                    raise Exception(f"The journal {self.journal_path} is corrupt at line {torn}")
+                if not line.strip():
+                    continue
+                if not is_record(line):
+                    torn = nr
+                    continue
+                yield json.loads(line)
+
+
+    def get_invoice(self, creditor_id: AnyStr, doc_type: DocumentType, doc_nr: AnyStr) -> Optional[Dict]:
+        key = (creditor_id, doc_type.value, doc_nr)
+        return next((record for record in self.invoices() if invoice_key(record) == key), None)
+
+
+    def find_invoices(self, creditor_id: AnyStr = None, debtor_id: AnyStr = None, doc_type: DocumentType = None) -> List[Dict]:
+        return [
+            record for record in self.invoices()
+            if (creditor_id is None or record.get("creditor_id") == creditor_id)
+            and (debtor_id is None or record.get("debtor_id") == debtor_id)
+            and (doc_type is None or record.get("doc_type") == doc_type.value)
+        ]
+
+
+class SqliteStore:
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS companies (id TEXT PRIMARY KEY, data TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS policies (id TEXT PRIMARY KEY, data TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS currencies (id TEXT PRIMARY KEY, data TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS defaults (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS sequences (
+            creditor_id TEXT NOT NULL,
+            seq_id TEXT NOT NULL,
+            last_seq INTEGER NOT NULL,
+            PRIMARY KEY (creditor_id, seq_id)
+        );
+        CREATE TABLE IF NOT EXISTS invoices (
+            creditor_id TEXT NOT NULL,
+            doc_type TEXT NOT NULL,
+            doc_nr TEXT NOT NULL,
+            debtor_id TEXT,
+            issued_at TEXT NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (creditor_id, doc_type, doc_nr)
+        );
+        CREATE TABLE IF NOT EXISTS voided_sequences (
+            creditor_id TEXT NOT NULL,
+            seq_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            PRIMARY KEY (creditor_id, seq_id, seq)
+        );
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        INSERT OR IGNORE INTO meta (key, value) VALUES ('reference_version', 0);
+        CREATE INDEX IF NOT EXISTS invoices_creditor ON invoices (creditor_id);
+        CREATE INDEX IF NOT EXISTS invoices_debtor ON invoices (debtor_id);
+    """
+
+    REFERENCE_TABLES = ("companies", "policies", "currencies")
+
+    def __init__(self, path: AnyStr):
+        """
+        The db in SQLite, in WAL mode, with the same companies/defaults/policies/currencies model.
+        Issued documents go to an indexed invoices table and every write is its own transaction,
+        so saving one invoice costs the same however many invoices exist, and a crash never leaves
+        a half written db.
+        Args:
+            path (AnyStr): Path to the SQLite file. When it does not exist yet and a json db with the
+                           same name exists next to it, that db is imported.
+        """
+
+        self.path = path
+        self.db = SqliteDb(path)
+
+        is_new = not os.path.exists(path)
+        self.__migrate(self.db.connect())
+        self.db.connect().executescript(self.SCHEMA)
+
+        json_path = os.path.splitext(path)[0] + ".json"
+        if is_new and os.path.exists(json_path):
+            self.__import(JsonStore(json_path))
+
+
+    def __migrate(self, con: sqlite3.Connection) -> None:
+        # older versions keyed issued documents by their number only, which is not unique across creditors
+        keys = [row[1] for row in con.execute("PRAGMA table_info(invoices)") if row[5]]
+        if keys == ["doc_nr"]:
+            with Transaction(con):
+                con.execute("ALTER TABLE invoices RENAME TO invoices_by_nr")
+                con.execute("DROP INDEX IF EXISTS invoices_creditor")
+                con.execute("DROP INDEX IF EXISTS invoices_debtor")
+            con.executescript(self.SCHEMA)
+            with Transaction(con):
+                con.execute(
+                    "INSERT INTO invoices (creditor_id, doc_type, doc_nr, debtor_id, issued_at, data) "
+                    "SELECT creditor_id, doc_type, doc_nr, debtor_id, issued_at, data FROM invoices_by_nr"
+                )
+                con.execute("DROP TABLE invoices_by_nr")
+
+        # older versions handed released numbers out again, out of order; they are voided now
+        if con.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'released_sequences'").fetchone():
+            con.executescript(self.SCHEMA)
+            with Transaction(con):
+                con.execute(
+                    "INSERT OR IGNORE INTO voided_sequences (creditor_id, seq_id, seq) "
+                    "SELECT creditor_id, seq_id, seq FROM released_sequences"
+                )
+                con.execute("DROP TABLE released_sequences")
+
+
+    def __import(self, json_store: JsonStore) -> None:
+        # a new SQLite db starts from the json db next to it, reference data and issued documents
+        self.save(json_store.load())
+        sequences = json_store.sequences()
+        with self.transaction() as con:
+            con.executemany(
+                "INSERT OR REPLACE INTO sequences (creditor_id, seq_id, last_seq) VALUES (?, ?, ?)",
+                [
+                    (creditor_id, sid, last_seq)
+                    for creditor_id, last_sequences in sequences["last_sequences"].items()
+                    for sid, last_seq in last_sequences.items()
+                ]
+            )
+            con.executemany(
+                "INSERT OR IGNORE INTO voided_sequences (creditor_id, seq_id, seq) VALUES (?, ?, ?)",
+                [
+                    (creditor_id, sid, seq)
+                    for creditor_id, voided in sequences["voided_sequences"].items()
+                    for sid, numbers in voided.items()
+                    for seq in numbers
+                ]
+            )
+            for record in json_store.invoices():
+                self.__insert_invoice(con, DocumentType(record.get("doc_type", "INVOICE")), record)
+
+
+    def transaction(self) -> Transaction:
+        """
+        A write transaction on the connection of the calling thread, for use in a with statement.
+        """
+
+        return self.db.transaction()
+
+
+    def __bump_version(self, con: sqlite3.Connection) -> None:
+        con.execute("UPDATE meta SET value = value + 1 WHERE key = 'reference_version'")
+
+
+    def version(self) -> int:
+        """
+        Changes whenever the data returned by load changes. Reserving numbers and committing invoices does not change it.
+        """
+
+        return self.db.connect().execute("SELECT value FROM meta WHERE key = 'reference_version'").fetchone()[0]
+
+
+    def load(self) -> Dict:
+        """
+        Loads the reference data in the json db model. Sequences and issued invoices are not loaded,
+        use last_sequence, get_invoice and find_invoices for those.
+        """
+
+        con = self.db.connect()
+        db = {"invoices": {}}
+
+        for table in self.REFERENCE_TABLES:
+            db[table] = {row[0]: json.loads(row[1]) for row in con.execute(f"SELECT id, data FROM {table}")}
+        db["defaults"] = {row[0]: json.loads(row[1]) for row in con.execute("SELECT key, value FROM defaults")}
+
+        return db
+
+
+    def save(self, db: Dict) -> None:
+        """
+        Replaces the reference data with the given db. The sequences of known creditors and the
+        issued invoices are owned by the store and kept; sequences of new creditors are added.
+        The issued invoices in the db, if any, are ignored.
+        """
+
+        with self.transaction() as con:
+            self.__bump_version(con)
+            for table in self.REFERENCE_TABLES:
+                con.execute(f"DELETE FROM {table}")
+                con.executemany(
+                    f"INSERT INTO {table} (id, data) VALUES (?, ?)",
+                    [
+                        (key, json.dumps({k: v for k, v in value.items() if k != "last_sequences"}))
+                        for key, value in db.get(table, {}).items()
+                    ]
+                )
+
+            con.execute("DELETE FROM defaults")
+            con.executemany(
+                "INSERT INTO defaults (key, value) VALUES (?, ?)",
+                [(key, json.dumps(value)) for key, value in db.get("defaults", {}).items()]
+            )
+
+            con.executemany(
+                "INSERT OR IGNORE INTO sequences (creditor_id, seq_id, last_seq) VALUES (?, ?, ?)",
+                [
+                    (creditor_id, sid, last_seq)
+                    for creditor_id, company in db.get("companies", {}).items()
+                    for sid, last_seq in company.get("last_sequences", {}).items()
+                ]
+            )
+
+
+    def __insert_invoice(self, con: sqlite3.Connection, doc_type: DocumentType, record: Dict) -> None:
+        # a plain insert: committing a document that exists already is an error, never a replace
+        con.execute(
+            "INSERT INTO invoices (creditor_id, doc_type, doc_nr, debtor_id, issued_at, data) VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                record["creditor_id"], doc_type.value, record["doc_nr"], record.get("debtor_id"),
+                datetime.now().isoformat(timespec="seconds"), json.dumps(dict(record, doc_type=doc_type.value)),
+            )
+        )
+
+
+    def __last_seq(self, con: sqlite3.Connection, creditor_id: AnyStr, sid: AnyStr) -> int:
+        row = con.execute(
+            "SELECT last_seq FROM sequences WHERE creditor_id = ? AND seq_id = ?", (creditor_id, sid)
+        ).fetchone()
+        return row[0] if row else 0
+
+
+    def last_sequence(self, creditor_id: AnyStr, doc_type: DocumentType) -> int:
+        """
+        Returns the last number issued, or reserved, in the creditor's sequence.
+        """
+
+        return self.__last_seq(self.db.connect(), creditor_id, seq_id(doc_type))
+
+
+    def reserve_sequence(self, creditor_id: AnyStr, doc_type: DocumentType, count: int = 1) -> List[int]:
+        """
+        Reserves the next count numbers of the creditor's sequence, in one transaction.
+        """
+
+        sid = seq_id(doc_type)
+        with self.transaction() as con:
+            last_seq = self.__last_seq(con, creditor_id, sid)
+            con.execute(
+                "INSERT OR REPLACE INTO sequences (creditor_id, seq_id, last_seq) VALUES (?, ?, ?)",
+                (creditor_id, sid, last_seq + count)
+            )
+        return list(range(last_seq + 1, last_seq + 1 + count))
+
+
+    def release_sequence(self, creditor_id: AnyStr, doc_type: DocumentType, numbers: Iterable[int]) -> None:
+        """
+        Returns reserved numbers that were not used, in one transaction. See release_numbers.
+        """
+
+        sid = seq_id(doc_type)
+        with self.transaction() as con:
+            voided = [row[0] for row in con.execute(
+                "SELECT seq FROM voided_sequences WHERE creditor_id = ? AND seq_id = ?", (creditor_id, sid)
+            )]
+            last_seq, voided = release_numbers(self.__last_seq(con, creditor_id, sid), voided, numbers)
+
+            con.execute(
+                "INSERT OR REPLACE INTO sequences (creditor_id, seq_id, last_seq) VALUES (?, ?, ?)",
+                (creditor_id, sid, last_seq)
+            )
+            con.execute("DELETE FROM voided_sequences WHERE creditor_id = ? AND seq_id = ?", (creditor_id, sid))
+            con.executemany(
+                "INSERT INTO voided_sequences (creditor_id, seq_id, seq) VALUES (?, ?, ?)",
+                [(creditor_id, sid, n) for n in voided]
+            )
+
+
+    def commit_invoice(self, doc_type: DocumentType, record: Dict) -> None:
+        """
+        Stores an issued document. Its number is reserved beforehand with reserve_sequence.
+        """
+
+        self.commit_batch(doc_type, [record])
+
+
+    def commit_batch(self, doc_type: DocumentType, records: List[Dict]) -> None:
+        """
+        Stores the issued documents, in one transaction.
+        Raises:
+            sqlite3.IntegrityError: If a document with the same creditor, type and number exists already.
+                                    None of the documents are stored then.
+        """
+
+        with self.transaction() as con:
+            for record in records:
+                self.__insert_invoice(con, doc_type, record)
+
+
+    def get_invoice(self, creditor_id: AnyStr, doc_type: DocumentType, doc_nr: AnyStr) -> Optional[Dict]:
+        row = self.db.connect().execute(
+            "SELECT data FROM invoices WHERE creditor_id = ? AND doc_type = ? AND doc_nr = ?",
+            (creditor_id, doc_type.value, doc_nr)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+
+    def find_invoices(self, creditor_id: AnyStr = None, debtor_id: AnyStr = None, doc_type: DocumentType = None) -> List[Dict]:
+        query, params = "SELECT data FROM invoices WHERE 1 = 1", []
+        if creditor_id is not None:
+            query += " AND creditor_id = ?"
+            params.append(creditor_id)
+        if debtor_id is not None:
+            query += " AND debtor_id = ?"
+            params.append(debtor_id)
+        if doc_type is not None:
+            query += " AND doc_type = ?"
+            params.append(doc_type.value)
+        return [json.loads(row[0]) for row in self.db.connect().execute(query + " ORDER BY issued_at", params)]
+
+
+def open_store(path: AnyStr):
+    """
+    Opens the db at path: SQLite for .sqlite, .sqlite3 and .db files, json otherwise.
+    """
+
+    if os.path.splitext(path)[1].lower() in (".sqlite", ".sqlite3", ".db"):
+        return SqliteStore(path)
+    return JsonStore(path)
@@ -0,0 +1,280 @@
+from typing import AnyStr, Dict, Iterable, List, Tuple
+
+
+def to_cents(amount) -> int:
+    return round(amount * 100)
+
+
+class Party:
+    """
+    A company as printed on a document, the debtor in the header or the creditor in the footer.
+    Parties come from the db and are shared by every invoice of the same debtor or creditor.
+    Fields the renderers do not know are kept in extra.
+    """
+
+    __slots__ = ("name", "tav", "street", "nr", "zip", "city", "country",
+                 "vat", "email", "phone", "bank_account", "rpr", "extra")
+
+    FIELDS = __slots__[:-1]
+
+    def __init__(self, **fields):
+        for key in self.FIELDS:
+            setattr(self, key, fields.get(key))
+        self.extra = {key: value for key, value in fields.items() if key not in self.FIELDS} or None
+
+
+    @classmethod
+    def from_dict(cls, data: Dict, prefix: AnyStr = "", exclude: Iterable[AnyStr] = ()) -> "Party":
+        """
+        Reads a party from a company in the db, or from the prefixed fields of a header or footer.
+        Args:
+            data (Dict): The company, or the header or footer data.
+            prefix (AnyStr, optional): The prefix of the fields, e.g. 'debtor_'. Defaults to none.
+            exclude (Iterable[AnyStr], optional): Fields that are not part of the party, e.g. 'last_sequences'.
+        """
+
+        return cls(**{
+            key[len(prefix):]: value
+            for key, value in data.items()
+            if key.startswith(prefix) and key[len(prefix):] not in exclude
+        })
+
+
+    def to_dict(self, prefix: AnyStr = "") -> Dict:
+        """
+        Returns the fields that are set, prefixed for a header or footer, e.g. with 'creditor_'.
+        """
+
+        fields = {prefix + key: getattr(self, key) for key in self.FIELDS if getattr(self, key) is not None}
+        if self.extra:
+            fields.update((prefix + key, value) for key, value in self.extra.items())
+        return fields
+
+
+class LineItem:
+    """
+    One line of an invoice. The amounts are kept in cents, as computed by the TotalsEngine.
+    """
+
+    __slots__ = ("key", "description", "qty", "price", "vat_pct", "base_cents", "vat_cents")
+
+    def __init__(self, key: AnyStr, description: AnyStr, qty, price=None, vat_pct=None, base_cents: int = 0, vat_cents: int = 0):
+        self.key = key
+        self.description = description
+        self.qty = qty
+        self.price = price
+        self.vat_pct = vat_pct
+        self.base_cents = base_cents
+        self.vat_cents = vat_cents
+
+
+    @property
+    def base_amt(self) -> float:
+        return self.base_cents / 100
+
+
+    @property
+    def vat_amt(self) -> float:
+        return self.vat_cents / 100
+
+
+    @property
+    def total_amt(self) -> float:
+        return (self.base_cents + self.vat_cents) / 100
+
+
+    @classmethod
+    def from_body(cls, key: AnyStr, item: Dict) -> "LineItem":
+        """
+        Reads an item of the document format, with a 'description', 'qty', the amounts and optionally the 'unit_amt'.
+        """
+
+        return cls(key, item["description"], item["qty"], item.get("unit_amt"), None,
+                   to_cents(item["base_amt"]), to_cents(item["vat_amt"]))
+
+
+    def to_input(self) -> Dict:
+        return {"description": self.description, "qty": self.qty, "price": self.price, "vat_pct": self.vat_pct}
+
+
+    def to_body(self) -> Dict:
+        item = {"description": self.description, "qty": self.qty}
+        if self.price is not None:
+            item["unit_amt"] = self.price
+        item["base_amt"] = self.base_amt
+        item["vat_amt"] = self.vat_amt
+        item["total_amt"] = self.total_amt
+        return item
+
+
+class Totals:
+    """
+    The totals of an invoice in cents, with the base and vat per vat rate.
+    """
+
+    __slots__ = ("base_cents", "vat_cents", "vat_rates")
+
+    def __init__(self, base_cents: int = 0, vat_cents: int = 0, vat_rates: Tuple[Tuple, ...] = ()):
+        self.base_cents = base_cents
+        self.vat_cents = vat_cents
+        self.vat_rates = vat_rates
+
+
+    @classmethod
+    def from_rates(cls, vat_rates: Dict) -> "Totals":
+        """
+        Builds the totals from the base and vat cents per rate, as returned by TotalsEngine.compute_cents.
+        """
+
+        return cls(
+            sum(base_cents for base_cents, _ in vat_rates.values()),
+            sum(vat_cents for _, vat_cents in vat_rates.values()),
+            tuple((rate, base_cents, vat_cents) for rate, (base_cents, vat_cents) in vat_rates.items())
+        )
+
+
+    @property
+    def base_amt(self) -> float:
+        return self.base_cents / 100
+
+
+    @property
+    def vat_amt(self) -> float:
+        return self.vat_cents / 100
+
+
+    @property
+    def total_amt(self) -> float:
+        return (self.base_cents + self.vat_cents) / 100
+
+
+class Invoice:
+    """
+    An invoice ready to be rendered. Much smaller in memory than its document data: the parties,
+    policies and symbol are shared and the amounts are integers, so a batch can hold many of them.
+    It pickles to worker processes and is turned into document data by to_doc_data only when rendered.
+    """
+
+    __slots__ = ("invoice_nr", "title", "path_image", "invoice_date", "delivery_date", "period",
+                 "due_date", "payment_date", "debtor_id", "creditor_id", "debtor", "creditor",
+                 "items", "totals", "symbol", "policies", "skeleton_key")
+
+    def __init__(self, **fields):
+        for key in self.__slots__:
+            setattr(self, key, fields.get(key))
+        if self.items is None:
+            self.items = ()
+
+
+    @classmethod
+    def from_doc_data(cls, doc_data: Dict) -> "Invoice":
+        """
+        Reads an invoice from document data, as in files/invoices/json/invoice_example.json.
+        """
+
+        header, body, footer = doc_data["header"], doc_data["body"], doc_data["footer"]
+        items = body["items"].items() if isinstance(body["items"], dict) else enumerate(body["items"], 1)
+
+        return cls(
+            invoice_nr=header.get("invoice_nr"),
+            title=header.get("title"),
+            path_image=header.get("path_image"),
+            invoice_date=header.get("invoice_date"),
+            delivery_date=header.get("delivery_date"),
+            period=header.get("period"),
+            due_date=header.get("due_date", body.get("due_date")),
+            payment_date=body.get("payment_date"),
+            debtor=Party.from_dict(header, "debtor_"),
+            creditor=Party.from_dict(footer, "creditor_"),
+            items=tuple(LineItem.from_body(str(key), item) for key, item in items),
+            totals=Totals(to_cents(body["invoice_base_amt"]), to_cents(body["invoice_vat_amt"])),
+            symbol=body.get("symbol"),
+            policies=body.get("policies"),
+            skeleton_key=doc_data.get("skeleton_key"),
+        )
+
+
+    def to_doc_data(self) -> Dict:
+        """
+        Returns the document data the renderers read, with the header, body and footer fields.
+        """
+
+        header = {"path_image": self.path_image, "title": self.title, "invoice_date": self.invoice_date}
+        if self.period is not None:
+            header["period"] = self.period
+        else:
+            header["delivery_date"] = self.delivery_date
+        header["due_date"] = self.due_date
+        header.update(self.debtor.to_dict("debtor_"))
+        header["invoice_nr"] = self.invoice_nr
+
+        body = {"due_date": self.due_date}
+        if self.policies is not None:
+            body["policies"] = self.policies
+        body["symbol"] = self.symbol
+        if self.payment_date is not None:
+            body["payment_date"] = self.payment_date
+        body["items"] = {item.key: item.to_body() for item in self.items}
+        body["invoice_base_amt"] = self.totals.base_amt
+        body["invoice_vat_amt"] = self.totals.vat_amt
+        body["invoice_total_amt"] = self.totals.total_amt
+        body["vat_rates"] = {
+            rate: {"base_amt": base_cents / 100, "vat_amt": vat_cents / 100}
+            for rate, base_cents, vat_cents in self.totals.vat_rates
+        }
+        if self.creditor.bank_account is not None:
+            body["creditor_bank_account"] = self.creditor.bank_account
+
+        doc_data = {"header": header, "body": body, "footer": self.creditor.to_dict("creditor_")}
+        if self.skeleton_key is not None:
+            doc_data["skeleton_key"] = self.skeleton_key
+        return doc_data
+
+
+    def to_input(self) -> Dict:
+        """
+        Returns the invoice in the input format, as in files/invoices/json/smart_example.json.
+        Only invoices built from input have the price and vat rate of their items; document data keeps
+        the amounts only, so an invoice read by from_doc_data cannot be turned back into input.
+        Raises:
+            Exception: If an item has no price or vat rate.
+        """
+
+        if any(item.price is None or item.vat_pct is None for item in self.items):
+            raise Exception(f"Invoice {self.invoice_nr} has items without a price or vat rate, it was not built from input")
+
+        data = {}
+        for key in ["debtor_id", "creditor_id", "invoice_date", "delivery_date", "period", "due_date", "payment_date"]:
+            if getattr(self, key) is not None:
+                data[key] = getattr(self, key)
+        data["items"] = {item.key: item.to_input() for item in self.items}
+        return data
+
+
+    def to_record(self, pdf_path: AnyStr) -> Dict:
+        """
+        The summary of the issued invoice that is kept in the db.
+        """
+
+        return {
+            "doc_nr": self.invoice_nr,
+            "creditor_id": self.creditor_id,
+            "debtor_id": self.debtor_id,
+            "invoice_date": self.invoice_date,
+            "due_date": self.due_date,
+            "base_amt": self.totals.base_amt,
+            "vat_amt": self.totals.vat_amt,
+            "total_amt": self.totals.total_amt,
+            "pdf_path": pdf_path,
+        }
+
+
+def line_items(items: Dict, amounts: List[Tuple[int, int]]) -> Tuple[LineItem, ...]:
+    """
+    Builds the line items of an invoice from its input items and their base and vat cents.
+    """
+
+    return tuple(
+        LineItem(key, item["description"], item["qty"], item["price"], item["vat_pct"], base_cents, vat_cents)
+        for (key, item), (base_cents, vat_cents) in zip(items.items(), amounts)
+    )
@@ -0,0 +1,82 @@
+import threading
+from typing import AnyStr, Dict
+
+from models import Party
+
+
+class CompiledParties:
+
+    def __init__(self, db: Dict):
+        """
+        The companies, policies and currencies of one version of the db, resolved into the parties and
+        context an invoice is built from. Each is built on first use and then shared by every invoice
+        of that creditor or debtor, so a batch only builds its per-invoice fields.
+        Args:
+            db (Dict): The db the parties are built from. It is never changed.
+        Attributes:
+            db (Dict): The db the parties were built from.
+        """
+
+        self.db = db
+        self.parties = {}
+        self.contexts = {}
+        self.lock = threading.Lock()
+
+
+    def party(self, company_id: AnyStr) -> Party:
+        """
+        Returns a company as a Party, shared by every invoice of that debtor or creditor.
+        Raises:
+            KeyError: If the company is not in the db.
+        """
+
+        party = self.parties.get(company_id)
+        if party is None:
+            party = Party.from_dict(self.db["companies"][company_id], exclude=["last_sequences"])
+            with self.lock:
+                party = self.parties.setdefault(company_id, party)
+        return party
+
+
+    def context(self, policy_ids=None, currency_id: AnyStr = None) -> Dict:
+        """
+        Returns the body fields shared by all invoices: the policies and the currency symbol.
+        Args:
+            policy_ids (optional): The policies to print. Defaults to the default policies.
+            currency_id (AnyStr, optional): The currency. Defaults to the default currency.
+        """
+
+        policy_ids = tuple(self.db["defaults"]["policy_ids"] if policy_ids is None else policy_ids)
+        currency_id = self.db["defaults"]["currency_id"] if currency_id is None else currency_id
+
+        key = (policy_ids, currency_id)
+        block = self.contexts.get(key)
+        if block is None:
+            block = {
+                "policies": [self.db["policies"][pid] for pid in policy_ids],
+                "symbol": self.db["currencies"][currency_id]["symbol"]
+            }
+            with self.lock:
+                self.contexts[key] = block
+        return block
+
+
+_compiled = None
+_compiled_lock = threading.Lock()
+
+
+def compiled_parties(db: Dict) -> CompiledParties:
+    """
+    The compiled parties of the given db. They are rebuilt when a processor brings a new version of the db,
+    i.e. after the reference data was reloaded, and shared between processors until then.
+    """
+
+    global _compiled
+
+    compiled = _compiled
+    if compiled is None or compiled.db is not db:
+        with _compiled_lock:
+            if _compiled is None or _compiled.db is not db:
+                _compiled = CompiledParties(db)
+            compiled = _compiled
+    return compiled
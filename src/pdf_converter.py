@@ -0,0 +1,400 @@
+import os
+import queue
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import AnyStr, Optional, Union
+
+try:
+    import uno
+except ImportError:
+    # uno is only available in the python that ships with LibreOffice, or from the distro's
+    # python3-uno package; it cannot be installed with pip. See the README.
+    uno = None
+
+
+# printed when the workers cannot be kept warm
+UNO_MISSING = (
+    "The uno module is not available, so LibreOffice is started once per document instead of once per worker. "
+    "Install python3-uno, or run with the python bundled with LibreOffice, to keep the workers warm."
+)
+
+
+class SofficeWorker:
+
+    def __init__(self, profile_dir: AnyStr, soffice_bin: AnyStr = None, startup_timeout: float = 30):
+        """
+        A single warm LibreOffice instance that converts documents to pdf.
+        Args:
+            profile_dir (AnyStr): The LibreOffice user profile of this worker. It is created on first use and
+                                  reused afterwards, so workers never contend for the same profile lock.
+            soffice_bin (AnyStr, optional): The LibreOffice executable. Defaults to the first of
+                                            'soffice' or 'libreoffice' found on the PATH.
+            startup_timeout (float, optional): Seconds to wait for the instance to accept connections.
+        Attributes:
+            process (Popen): The headless soffice process, None until started.
+            desktop: The UNO desktop of the running instance, None when uno is not available.
+        """
+
+        self.profile_dir = os.path.abspath(profile_dir)
+        self.soffice_bin = soffice_bin or shutil.which("soffice") or shutil.which("libreoffice") or "libreoffice"
+        self.startup_timeout = startup_timeout
+        self.port = None
+        self.process = None
+        self.desktop = None
+
+        os.makedirs(self.profile_dir, exist_ok=True)
+
+
+    def __base_args(self):
+        return [
+            self.soffice_bin,
+            f'-env:UserInstallation={Path(self.profile_dir).as_uri()}',
+            '--headless', '--invisible', '--nologo', '--nodefault', '--norestore',
+        ]
+
+
+    def __free_port(self) -> int:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.bind(("127.0.0.1", 0))
+            return s.getsockname()[1]
+
+
+    def start(self) -> None:
+        """
+        Starts the soffice listener and connects to it. Without uno there is nothing to keep warm,
+        so the worker falls back to a one-shot conversion per document.
+        """
+
+        if uno is None:
+            return
+
+        self.port = self.__free_port()
+        self.process = subprocess.Popen(
+            self.__base_args() + [f'--accept=socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext'],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+
+        local_ctx = uno.getComponentContext()
+        resolver = local_ctx.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local_ctx)
+
+        # the listener needs a moment before it accepts connections
+        deadline = time.monotonic() + self.startup_timeout
+        while True:
+            try:
+                ctx = resolver.resolve(f"uno:socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext")
+                break
+            except Exception:
+                if time.monotonic() > deadline or self.process.poll() is not None:
+                    self.kill()
+                    raise Exception(f"Could not start LibreOffice on port {self.port}")
+                time.sleep(0.1)
+
+        self.desktop = ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+
+
+    def stop(self) -> None:
+        """
+        Terminates the soffice instance, if any.
+        """
+
+        if self.desktop is not None:
+            try:
+                self.desktop.terminate()
+            except Exception:
+                pass
+            self.desktop = None
+
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.kill()
+            self.process = None
+
+
+    def kill(self) -> None:
+        """
+        Kills the soffice instance and everything it spawned, without waiting for it to cooperate.
+        """
+
+        self.desktop = None
+        if self.process is not None:
+            self.__kill_group(self.process)
+            self.process = None
+
+
+    def __kill_group(self, process: subprocess.Popen) -> None:
+        # soffice forks soffice.bin, so the whole session has to go
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        process.wait()
+
+
+    def restart(self) -> None:
+        """
+        Replaces the soffice instance with a fresh one, reusing the same profile.
+        """
+
+        self.kill()
+        self.start()
+
+
+    def is_alive(self) -> bool:
+        """
+        Checks whether the listener is still running. Always true for one-shot workers.
+        """
+
+        if uno is None:
+            return True
+        return self.process is not None and self.process.poll() is None
+
+
+    def __property(self, name, value):
+        prop = uno.createUnoStruct("com.sun.star.beans.PropertyValue")
+        prop.Name = name
+        prop.Value = value
+        return prop
+
+
+    def convert(self, docx_path: AnyStr, pdf_path: AnyStr, timeout: float = None) -> None:
+        """
+        Converts a docx file to pdf.
+        Args:
+            docx_path (AnyStr): Path to the source document.
+            pdf_path (AnyStr): Path where the pdf will be written.
+            timeout (float, optional): Seconds after which the conversion is aborted and soffice is killed.
+        Returns:
+            None
+        Raises:
+            TimeoutError: If the conversion did not finish in time.
+        """
+
+        if self.desktop is None:
+            outdir = os.path.dirname(os.path.abspath(pdf_path))
+            process = subprocess.Popen(
+                self.__base_args() + ['--convert-to', 'pdf', '--outdir', outdir, docx_path],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+            try:
+                returncode = process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                self.__kill_group(process)
+                raise TimeoutError(f"Conversion of {docx_path} timed out after {timeout}s")
+            if returncode != 0:
+                raise Exception(f"LibreOffice exited with code {returncode} converting {docx_path}")
+
+            converted = os.path.join(outdir, os.path.splitext(os.path.basename(docx_path))[0] + '.pdf')
+            if os.path.abspath(converted) != os.path.abspath(pdf_path):
+                os.replace(converted, pdf_path)
+            return
+
+        # a hung document blocks the UNO call, so a watchdog kills soffice to release it
+        timed_out = threading.Event()
+        watchdog = None
+        if timeout is not None:
+            def expire():
+                timed_out.set()
+                self.kill()
+            watchdog = threading.Timer(timeout, expire)
+            watchdog.start()
+
+        try:
+            document = self.desktop.loadComponentFromURL(
+                uno.systemPathToFileUrl(os.path.abspath(docx_path)), "_blank", 0,
+                (self.__property("Hidden", True),)
+            )
+            try:
+                document.storeToURL(
+                    uno.systemPathToFileUrl(os.path.abspath(pdf_path)),
+                    (self.__property("FilterName", "writer_pdf_Export"),)
+                )
+            finally:
+                document.close(True)
+        except Exception as e:
+            if timed_out.is_set():
+                raise TimeoutError(f"Conversion of {docx_path} timed out after {timeout}s")
+            raise e
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+
+
+class PdfConverter:
+
+    def __init__(self,
+                 workers: int = 1,
+                 soffice_bin: AnyStr = None,
+                 profile_root: AnyStr = None,
+                 timeout: float = 120,
+                 require_uno: bool = False):
+        """
+        A long-lived conversion service: a pool of warm LibreOffice instances behind a job queue.
+        The startup cost of LibreOffice is paid once per worker instead of once per document, and every
+        worker has its own user profile so conversions run in parallel.
+        Keeping the instances warm needs the uno module. Without it every document is converted by a
+        one-shot 'soffice --convert-to', which still runs in parallel but pays the startup every time;
+        a warning is printed then, or an exception raised with require_uno.
+        Args:
+            workers (int, optional): Number of soffice instances to keep running. Defaults to 1.
+            soffice_bin (AnyStr, optional): The LibreOffice executable.
+            profile_root (AnyStr, optional): Directory holding one profile per worker. Defaults to a new
+                                             'facteur-soffice-*' directory in the system temp dir, so
+                                             concurrent runs never share a profile, removed again by close.
+            timeout (float, optional): Default per-job timeout in seconds. A worker that exceeds it is
+                                       killed and restarted. None disables the timeout. Defaults to 120.
+            require_uno (bool, optional): Raise instead of falling back to one-shot conversions when uno
+                                          is not available. Defaults to False.
+        Raises:
+            Exception: If require_uno is set and uno is not available.
+        Example:
+            >>> with PdfConverter(workers=2) as converter:
+            ...     converter.convert('files/invoices/I_2024-1.docx')
+            'files/invoices/I_2024-1.pdf'
+        """
+
+        if uno is None:
+            if require_uno:
+                raise Exception(UNO_MISSING)
+            print(f"Warning: {UNO_MISSING}")
+
+        # a profile root of our own is removed again on close, a given one is left for the next run
+        self.owned_profile_root = None
+        if profile_root is None:
+            profile_root = self.owned_profile_root = tempfile.mkdtemp(prefix='facteur-soffice-')
+
+        self.timeout = timeout
+        self.jobs = queue.Queue()
+        self.workers = [
+            SofficeWorker(os.path.join(profile_root, f'worker-{i}'), soffice_bin)
+            for i in range(max(1, workers))
+        ]
+        self.threads = []
+        self.closed = False
+
+        for worker in self.workers:
+            thread = threading.Thread(target=self.__run, args=(worker,), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+    def __run(self, worker: SofficeWorker) -> None:
+        try:
+            worker.start()
+        except Exception as e:
+            print(f"An error occurred: {e}")
+
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+
+            future, docx, pdf_path, timeout = job
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                if not worker.is_alive():
+                    worker.restart()
+                future.set_result(self.__convert(worker, docx, pdf_path, timeout))
+            except TimeoutError as e:
+                future.set_exception(e)
+                self.__restart(worker)
+            except Exception as e:
+                future.set_exception(e)
+
+        worker.stop()
+
+
+    def __restart(self, worker: SofficeWorker) -> None:
+        try:
+            worker.restart()
+        except Exception as e:
+            print(f"An error occurred: {e}")
+
+
+    def __convert(self, worker: SofficeWorker, docx: Union[AnyStr, bytes], pdf_path: Optional[AnyStr], timeout: Optional[float]) -> Union[AnyStr, bytes]:
+        if isinstance(docx, bytes):
+            # documents passed in memory are round-tripped through a scratch directory
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                src = os.path.join(tmp_dir, 'document.docx')
+                dst = os.path.join(tmp_dir, 'document.pdf')
+                with open(src, 'wb') as f:
+                    f.write(docx)
+                worker.convert(src, dst, timeout)
+                if pdf_path:
+                    shutil.move(dst, pdf_path)
+                    return pdf_path
+                with open(dst, 'rb') as f:
+                    return f.read()
+
+        if pdf_path is None:
+            pdf_path = os.path.splitext(docx)[0] + '.pdf'
+        worker.convert(docx, pdf_path, timeout)
+        return pdf_path
+
+
+    def submit(self, docx: Union[AnyStr, bytes], pdf_path: AnyStr = None, timeout: float = None) -> Future:
+        """
+        Queues a document for conversion.
+        Args:
+            docx (Union[AnyStr, bytes]): Path to a docx file, or the docx file contents.
+            pdf_path (AnyStr, optional): Where to write the pdf. When omitted, a path is converted next to
+                                         the source and a bytes document returns the pdf contents.
+            timeout (float, optional): Timeout for this job. Defaults to the converter's timeout.
+        Returns:
+            Future: Resolves to the pdf path, or to the pdf bytes for in-memory documents without a pdf_path.
+        """
+
+        if self.closed:
+            raise Exception("PdfConverter is closed")
+
+        future = Future()
+        self.jobs.put((future, docx, pdf_path, self.timeout if timeout is None else timeout))
+        return future
+
+
+    def convert(self, docx: Union[AnyStr, bytes], pdf_path: AnyStr = None, timeout: float = None) -> Union[AnyStr, bytes]:
+        """
+        Converts a document and waits for the result. See submit.
+        """
+
+        return self.submit(docx, pdf_path, timeout).result()
+
+
+    def close(self) -> None:
+        """
+        Waits for the queued jobs, shuts down all soffice instances and removes the profiles it created.
+        """
+
+        if self.closed:
+            return
+
+        self.closed = True
+        for _ in self.threads:
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
+
+        if self.owned_profile_root is not None:
+            shutil.rmtree(self.owned_profile_root, ignore_errors=True)
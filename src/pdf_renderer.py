@@ -0,0 +1,209 @@
+from typing import AnyStr, Dict, List
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Image, LongTable, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from assets import assets
+from doc_helper import DocHelper
+
+
+# the detail columns of DocHelper.set_body, in cm
+DETAIL_COL_WIDTHS = [5.5 * cm, 1.5 * cm, 3 * cm, 3 * cm, 3 * cm, 3 * cm]
+
+FOOTER_HEIGHT = 2.2 * cm
+
+
+class PdfRenderer:
+
+    def __init__(self):
+        """
+        Draws an invoice straight to pdf, in process, from the same header, body and footer data
+        as DocHelper. The layout follows the docx template: a header with title, logo, invoice details
+        and debtor address, the details table with totals, the payment text and the creditor footer.
+        """
+
+        self.dhelpr = DocHelper()
+
+        self.styles = {
+            "title": ParagraphStyle("title", fontName="Helvetica", fontSize=20, leading=24),
+            "heading": ParagraphStyle("heading", fontName="Helvetica", fontSize=14, leading=17, spaceBefore=12, spaceAfter=12),
+            "normal": ParagraphStyle("normal", fontName="Helvetica", fontSize=12, leading=14.5),
+            "footer": ParagraphStyle("footer", fontName="Helvetica", fontSize=10, leading=12, alignment=TA_CENTER),
+        }
+
+
+    def __lines(self, *lines) -> AnyStr:
+        return "<br/>".join(escape(str(line)) for line in lines)
+
+
+    def set_header(self, data: Dict) -> List:
+        img_width, img_height = ImageReader(assets.get_image(data["path_image"], 7.5)).getSize()
+        logo = Image(assets.get_image(data["path_image"], 7.5), width=7.5 * cm, height=7.5 * cm * img_height / img_width)
+        logo.hAlign = "RIGHT"
+
+        if 'period' in data:
+            delivery_date_label = "Periode"
+            delivery_date = data["period"]
+        else:
+            delivery_date_label = "Leveringsdatum"
+            delivery_date = data["delivery_date"]
+
+        details = Table(
+            [
+                ["Factuur nr.", data["invoice_nr"]],
+                ["Factuurdatum", data["invoice_date"]],
+                [delivery_date_label, delivery_date],
+                ["Vervaldag", data["due_date"]],
+            ],
+            colWidths=[3.5 * cm, None],
+            style=TableStyle([
+                ("FONT", (0, 0), (-1, -1), "Helvetica", 12),
+                ("LEFTPADDING", (0, 0), (-1, -1), 0),
+                ("TOPPADDING", (0, 0), (-1, -1), 0),
+                ("BOTTOMPADDING", (0, 0), (-1, -1), 1),
+            ]),
+        )
+
+        debtor = [data['debtor_name']]
+        if 'debtor_tav' in data:
+            debtor.append(f't.a.v. {data["debtor_tav"]}')
+        debtor.append(f"{data['debtor_street']} {data['debtor_nr']}")
+        debtor.append(f'{data["debtor_zip"]} {data["debtor_city"]}')
+        debtor.append(f'{data["debtor_country"]}')
+
+        hoofd = Table(
+            [
+                [Paragraph(escape(data["title"]), self.styles["title"]), logo],
+                [details, Paragraph(self.__lines(*debtor), self.styles["normal"])],
+            ],
+            colWidths=[10.5 * cm, 7.5 * cm],
+            style=TableStyle([
+                ("VALIGN", (0, 0), (-1, -1), "TOP"),
+                ("LEFTPADDING", (0, 0), (-1, -1), 0),
+                ("RIGHTPADDING", (0, 0), (-1, -1), 0),
+                ("BOTTOMPADDING", (0, 0), (-1, -1), 12),
+            ]),
+        )
+
+        return [hoofd]
+
+
+    def set_body(self, data: Dict) -> List:
+        symbol = data["symbol"]
+        fmt = self.dhelpr.format_number
+
+        rows = [['Product beschrijving', 'Aantal', 'Eenheidsprijs', 'Bedrag excl. BTW', 'BTW', 'Bedrag incl. BTW']]
+
+        items = data["items"].values() if isinstance(data["items"], dict) else data["items"]
+        for item in items:
+            rows.append([
+                Paragraph(escape(f'{item["description"]}'), self.styles["normal"]),
+                fmt(item["qty"], 0),
+                f'{symbol} {fmt(item["unit_amt"])}',
+                f'{symbol} {fmt(item["base_amt"])}',
+                f'{symbol} {fmt(item["vat_amt"])}',
+                f'{symbol} {fmt(item["total_amt"])}',
+            ])
+
+        # one vat line per rate
+        vat_lines = self.dhelpr.vat_lines(data)
+        rows.append([
+            '', '', '', '',
+            Paragraph(
+                'Subtotaal<br/>'
+                + ''.join(f'{escape(label)}<br/>' for label, _ in vat_lines)
+                + '<b>Totaal</b>',
+                self.styles["normal"]
+            ),
+            Paragraph(
+                f'{escape(symbol)} {fmt(data["invoice_base_amt"])}<br/>'
+                + ''.join(f'{escape(symbol)} {fmt(vat_amt)}<br/>' for _, vat_amt in vat_lines)
+                + f'<b>{escape(symbol)} {fmt(data["invoice_total_amt"])}</b>',
+                self.styles["normal"]
+            ),
+        ])
+
+        # same lines as BorderTemplate.DETAIL_1: around the header row and above the totals
+        detail_tabel = LongTable(
+            rows,
+            colWidths=DETAIL_COL_WIDTHS,
+            repeatRows=1,
+            style=TableStyle([
+                ("FONT", (0, 0), (-1, -1), "Helvetica", 12),
+                ("FONTSIZE", (0, 0), (-1, 0), 10),
+                ("VALIGN", (0, 0), (-1, -1), "TOP"),
+                ("LINEABOVE", (0, 0), (-1, 0), 0.75, colors.black),
+                ("LINEBELOW", (0, 0), (-1, 0), 0.75, colors.black),
+                ("LINEABOVE", (0, -1), (-1, -1), 0.75, colors.black),
+            ]),
+        )
+
+        if "payment_date" in data:
+            trailing_text = f'Dit factuur is betaald op {data["payment_date"]}.'
+        else:
+            trailing_text = f'Gelieve het factuurbedrag van {symbol} {fmt(data["invoice_total_amt"])} te betalen voor {data["due_date"]} op rekeningnummer {data["creditor_bank_account"]}.'
+
+        return [
+            Paragraph('Details', self.styles["heading"]),
+            detail_tabel,
+            Spacer(1, 14.5),
+            Paragraph(escape(trailing_text), self.styles["normal"]),
+        ]
+
+
+    def set_footer(self, data: Dict):
+        """
+        Returns the callback that draws the creditor footer and page number on every page.
+        """
+
+        columns = [
+            [data["creditor_name"], f"{data['creditor_street']} {data['creditor_nr']}",
+             f'{data["creditor_zip"]} {data["creditor_city"]} {data["creditor_country"]}'],
+            [f'rpr {data["creditor_rpr"]}', f'btw {data["creditor_vat"]}', f'rek {data["creditor_bank_account"]}'],
+            [f'tel {data["creditor_phone"]}', f'{data["creditor_email"]}'],
+        ]
+
+        def draw_footer(canvas, doc):
+            voet = Table(
+                [[
+                    Paragraph(self.__lines(*columns[0]), self.styles["footer"]),
+                    Paragraph(self.__lines(*columns[1]), self.styles["footer"]),
+                    Paragraph(self.__lines(*columns[2], f'Pagina {canvas.getPageNumber()}'), self.styles["footer"]),
+                ]],
+                colWidths=[doc.width / 3] * 3,
+            )
+            voet.wrapOn(canvas, doc.width, FOOTER_HEIGHT)
+            voet.drawOn(canvas, doc.leftMargin, 1 * cm)
+
+        return draw_footer
+
+
+    def render(self, data: Dict, pdf_path: AnyStr) -> None:
+        """
+        Renders a document to pdf.
+        Args:
+            data (Dict): The header, body and footer data, as for DocHelper.
+            pdf_path (AnyStr): Where to write the pdf.
+        Returns:
+            None
+        """
+
+        document = SimpleDocTemplate(
+            pdf_path,
+            pagesize=A4,
+            leftMargin=1.5 * cm,
+            rightMargin=1.5 * cm,
+            topMargin=1.5 * cm,
+            bottomMargin=1 * cm + FOOTER_HEIGHT,
+            title=f'{data["header"]["title"]} {data["header"].get("invoice_nr", "")}'.strip(),
+        )
+
+        draw_footer = self.set_footer(data["footer"])
+        story = self.set_header(data["header"]) + self.set_body(data["body"])
+        document.build(story, onFirstPage=draw_footer, onLaterPages=draw_footer)
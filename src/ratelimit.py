@@ -0,0 +1,303 @@
+import email.utils
+import json
+import random
+import threading
+import time
+from typing import AnyStr, Callable, Dict, List, Optional
+
+import httplib2
+from google.auth.exceptions import TransportError
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+
+
+# quota units a user may spend per second, and what a call costs, by api
+# gmail: 250 units per user per second, sending costs 100 units, most reads 5
+# drive: 12,000 queries per user per minute, every call costs one
+QUOTAS = {
+    "gmail": {
+        "rate": 250,
+        "default_cost": 5,
+        "costs": {
+            "gmail.users.messages.send": 100,
+            "gmail.users.drafts.send": 100,
+            "gmail.users.drafts.create": 10,
+            "gmail.users.drafts.update": 15,
+            "gmail.users.messages.insert": 25,
+            "gmail.users.messages.import": 25,
+            "gmail.users.getProfile": 1,
+        },
+    },
+    "drive": {
+        "rate": 200,
+        "default_cost": 1,
+        "costs": {},
+    },
+}
+
+# times a call is retried after throttling, a server error or a dropped connection
+MAX_RETRIES = 6
+
+# the backoff of the first retry in seconds, doubled on every retry up to BACKOFF_MAX
+BACKOFF_BASE = 1
+BACKOFF_MAX = 64
+
+# after throttling the rate is halved, but never below this fraction of the quota
+MIN_RATE_FRACTION = 1 / 16
+
+# every successful call gives back this fraction of the quota, until the full rate is reached again
+RECOVERY_FRACTION = 1 / 50
+
+# reasons of a 403 that mean the quota was exceeded rather than access denied,
+# as in the legacy errors[] of a response and in the google.rpc.ErrorInfo of its details[]
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded", "RATE_LIMIT_EXCEEDED", "USER_RATE_LIMIT_EXCEEDED")
+
+# errors of a call that never got an answer: a dropped connection, a timeout, a failed token refresh
+TRANSPORT_ERRORS = (OSError, httplib2.HttpLib2Error, TransportError)
+
+
+class RateLimiter:
+
+    def __init__(self, rate: float, costs: Dict[AnyStr, int] = None, default_cost: int = 1):
+        """
+        A token bucket shared by every thread calling one api for one user. Every call first takes its
+        cost in quota units from the bucket, which refills at the rate of the quota, so bulk jobs run at the
+        highest rate the quota allows instead of being throttled by the api.
+        When the api throttles anyway, the rate is halved and every thread pauses for the backoff or the
+        Retry-After the api asked for. Successful calls raise the rate again step by step.
+        Args:
+            rate (float): The quota in units per second.
+            costs (Dict[AnyStr, int], optional): The cost of calls by method id, e.g. 'gmail.users.messages.send'.
+            default_cost (int, optional): The cost of calls not in costs. Defaults to 1.
+        """
+
+        self.max_rate = rate
+        self.rate = rate
+        self.costs = costs or {}
+        self.default_cost = default_cost
+        self.capacity = max([rate, *self.costs.values()])
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+        self.lock = threading.Lock()
+
+
+    def cost(self, method_id: AnyStr) -> int:
+        """
+        Returns the cost of a call in quota units.
+        """
+
+        return self.costs.get(method_id, self.default_cost)
+
+
+    def acquire(self, units: int) -> None:
+        """
+        Takes units from the bucket, waiting until they are available.
+        """
+
+        units = min(units, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.tokens >= units:
+                    self.tokens -= units
+                    return
+                else:
+                    wait = (units - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+    def throttled(self, delay: float) -> None:
+        """
+        Slows down after the api throttled a call: halves the rate and pauses every thread for delay seconds.
+        """
+
+        with self.lock:
+            self.rate = max(self.max_rate * MIN_RATE_FRACTION, self.rate / 2)
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+
+
+    def succeeded(self) -> None:
+        """
+        Raises the rate again after a successful call.
+        """
+
+        if self.rate < self.max_rate:
+            with self.lock:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * RECOVERY_FRACTION)
+
+
+    def retry_delay(self, error: Exception, attempt: int, idempotent: bool = True) -> Optional[float]:
+        """
+        Returns how long to wait before retrying a failed call, or None when it should not be retried.
+        Calls are retried after throttling. Server errors and dropped connections are only retried when
+        sending the call twice does no harm, since the server may have carried out the first one. The wait is the Retry-After of the response when there is one, else an
+        exponential backoff with jitter, so threads that failed together do not retry together.
+        Args:
+            error (Exception): The error of the call.
+            attempt (int): The number of retries so far.
+            idempotent (bool, optional): Whether the call may be sent twice. Defaults to True.
+        """
+
+        if attempt >= MAX_RETRIES:
+            return None
+
+        retry_after = None
+        if isinstance(error, HttpError):
+            if not (error.resp.status == 429 or is_rate_limited(error) or (error.resp.status >= 500 and idempotent)):
+                return None
+            retry_after = parse_retry_after(error.resp.get("retry-after"))
+        elif not (isinstance(error, TRANSPORT_ERRORS) and idempotent):
+            return None
+
+        if retry_after is not None:
+            return retry_after + random.uniform(0, 1)
+
+        backoff = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+        return backoff / 2 + random.uniform(0, backoff / 2)
+
+
+    def backoff(self, error: Exception, delay: float) -> None:
+        """
+        Waits before a retry. When the api throttled the call, every thread waits and the rate is lowered.
+        """
+
+        if isinstance(error, HttpError) and (error.resp.status == 429 or is_rate_limited(error)):
+            self.throttled(delay)
+        time.sleep(delay)
+
+
+    def call(self, function: Callable, cost: int, idempotent: bool = True):
+        """
+        Calls function once its cost is available, retrying it as long as retry_delay allows.
+        Args:
+            function (Callable): The call, e.g. the execute of a request.
+            cost (int): The cost of the call in quota units.
+            idempotent (bool, optional): Whether the call may be sent twice. Defaults to True.
+        Returns:
+            The result of function.
+        Raises:
+            Exception: The error of the last attempt, when the call cannot be retried any more.
+        """
+
+        attempt = 0
+        while True:
+            self.acquire(cost)
+            try:
+                result = function()
+            except Exception as e:
+                delay = self.retry_delay(e, attempt, idempotent)
+                if delay is None:
+                    raise
+                print(f"An error occurred, retrying in {delay:.1f}s: {e}")
+                self.backoff(e, delay)
+                attempt += 1
+                continue
+
+            self.succeeded()
+            return result
+
+
+def is_rate_limited(error: HttpError) -> bool:
+    """
+    Whether a 403 means the quota was exceeded, which is worth retrying, rather than access denied.
+    """
+
+    if error.resp.status != 403:
+        return False
+    return any(reason in RATE_LIMIT_REASONS for reason in error_reasons(error))
+
+
+def error_reasons(error: HttpError) -> List[AnyStr]:
+    """
+    The reasons of an error response, from both its legacy errors[] and its details[].
+    HttpError keeps only one of the two in error_details, so the response body is read again.
+    """
+
+    details = []
+    try:
+        body = json.loads(error.content)
+        bodies = body if isinstance(body, list) else [body]
+        for item in bodies:
+            details += item["error"].get("errors", []) + item["error"].get("details", [])
+    except (ValueError, KeyError, TypeError, AttributeError):
+        pass
+    if isinstance(error.error_details, list):
+        details += error.error_details
+
+    return [detail["reason"] for detail in details if isinstance(detail, dict) and "reason" in detail]
+
+
+def parse_retry_after(value: AnyStr) -> Optional[float]:
+    """
+    Reads a Retry-After header, either a number of seconds or an http date.
+    """
+
+    if not value:
+        return None
+    if value.strip().isdigit():
+        return float(value)
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class LimitedRequest(HttpRequest):
+
+    def __init__(self, *args, limiter: RateLimiter = None, **kwargs):
+        """
+        A request of an api client that goes through the client's rate limiter, with retries.
+        Clients build their requests with it, so every execute and next_chunk is limited.
+        Args:
+            limiter (RateLimiter): The rate limiter of the api.
+        """
+
+        super().__init__(*args, **kwargs)
+        self.limiter = limiter
+
+
+    def execute(self, http=None, num_retries=0):
+        # resumable uploads are executed chunk by chunk through next_chunk
+        if self.resumable:
+            return super().execute(http=http, num_retries=num_retries)
+
+        execute = super().execute
+        return self.limiter.call(
+            lambda: execute(http=http, num_retries=num_retries),
+            self.limiter.cost(self.methodId),
+            idempotent=self.method == "GET"
+        )
+
+
+    def next_chunk(self, http=None, num_retries=0):
+        # the call is paid for when the upload starts, a failed chunk is resumed where the server stopped
+        next_chunk = super().next_chunk
+        return self.limiter.call(
+            lambda: next_chunk(http=http, num_retries=num_retries),
+            self.limiter.cost(self.methodId) if self.resumable_uri is None else 0
+        )
+
+
+_limiters: Dict[tuple, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def rate_limiter(key, name: AnyStr) -> RateLimiter:
+    """
+    The shared rate limiter of an api for one user, created on first use.
+    Args:
+        key: Identifies the user, e.g. the credentials provider.
+        name (AnyStr): The api, a key of QUOTAS.
+    """
+
+    with _limiters_lock:
+        if (id(key), name) not in _limiters:
+            quota = QUOTAS[name]
+            _limiters[(id(key), name)] = RateLimiter(quota["rate"], quota["costs"], quota["default_cost"])
+        return _limiters[(id(key), name)]
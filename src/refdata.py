@@ -0,0 +1,112 @@
+import os
+import threading
+from typing import Any, AnyStr, Callable, Dict
+
+from invoice_store import open_store
+
+
+class FrozenDict(dict):
+    """
+    A dict that cannot be changed after it is built. Being a dict, it still serializes to json
+    and pickles to worker processes like the original data.
+    """
+
+    def __readonly(self, *args, **kwargs):
+        raise TypeError("Reference data is read-only")
+
+    __setitem__ = __delitem__ = __readonly
+    clear = pop = popitem = setdefault = update = __readonly
+
+    def __reduce__(self):
+        return (self.__class__, (dict(self),))
+
+
+def freeze(value: Any) -> Any:
+    """
+    Turns loaded json into a read-only structure: dicts become FrozenDicts, lists become tuples.
+    """
+
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class ReferenceData:
+
+    def __init__(self, path: AnyStr):
+        """
+        Process-wide cache of the db. The db is loaded once and only reloaded when its version changes,
+        the file's modification time and size for json or a version counter for SQLite, so creating
+        a processor per input no longer parses the db every time.
+        Args:
+            path (AnyStr): Path to the db.
+        Attributes:
+            store: The store of the db, shared by everyone using this cache.
+        """
+
+        self.store = open_store(path)
+        self.data = None
+        self.version = None
+        self.listeners = []
+        self.lock = threading.Lock()
+
+
+    def get(self) -> Dict:
+        """
+        Returns a read-only view of the db, reloading it first when it changed on disk.
+        """
+
+        version = self.store.version()
+        if version != self.version:
+            self.reload(version)
+        return self.data
+
+
+    def reload(self, version: Any = None) -> Dict:
+        """
+        Reloads the db and notifies the listeners. A long-running service can call this to hot-reload.
+        Args:
+            version (Any, optional): The version being loaded. Defaults to the store's current version.
+        Returns:
+            Dict: The new read-only view.
+        """
+
+        with self.lock:
+            version = self.store.version() if version is None else version
+            if self.data is not None and version == self.version:
+                return self.data
+
+            self.data = freeze(self.store.load())
+            self.version = version
+            listeners = list(self.listeners)
+
+        for listener in listeners:
+            listener(self.data)
+        return self.data
+
+
+    def on_reload(self, listener: Callable[[Dict], None]) -> None:
+        """
+        Registers a function that is called with the new view after every reload.
+        """
+
+        with self.lock:
+            self.listeners.append(listener)
+
+
+_caches: Dict[AnyStr, ReferenceData] = {}
+_caches_lock = threading.Lock()
+
+
+def reference_data(path: AnyStr) -> ReferenceData:
+    """
+    The shared cache of the db at path, created on first use.
+    """
+
+    key = os.path.abspath(path)
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = ReferenceData(path)
+        return _caches[key]
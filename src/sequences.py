@@ -0,0 +1,106 @@
+import threading
+from typing import AnyStr, List
+
+from enumerations import DocumentType
+
+
+class Reservation:
+
+    def __init__(self, store, creditor_id: AnyStr, doc_type: DocumentType, numbers: List[int]):
+        """
+        A block of sequence numbers reserved for one creditor and document type.
+        Numbers are handed out in order with take. Numbers that were not taken, or that were given back
+        because their document failed, are returned to the store by release, which also runs when the
+        reservation is used as a context manager and the block exits, normally or through an exception.
+        Invoices are numbered in chronological order, so a returned number is only handed out again when
+        no higher number was issued; a number given back from the middle of the block is voided instead.
+        Args:
+            store: The store the numbers were reserved in.
+            creditor_id (AnyStr): The creditor of the sequence.
+            doc_type (DocumentType): The document type of the sequence.
+            numbers (List[int]): The reserved numbers.
+        """
+
+        self.store = store
+        self.creditor_id = creditor_id
+        self.doc_type = doc_type
+        self.numbers = sorted(numbers)
+        self.unused = list(self.numbers)
+        self.lock = threading.Lock()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.release()
+
+
+    def take(self) -> int:
+        """
+        Hands out the lowest unused number.
+        Raises:
+            Exception: If all reserved numbers are used.
+        """
+
+        with self.lock:
+            if not self.unused:
+                raise Exception(f"No numbers left in the reservation for creditor {self.creditor_id}")
+            return self.unused.pop(0)
+
+
+    def give_back(self, number: int) -> None:
+        """
+        Marks a taken number as unused again, e.g. because its document could not be generated.
+        On release it is voided when a higher number was issued, see invoice_store.release_numbers.
+        """
+
+        with self.lock:
+            if number in self.numbers and number not in self.unused:
+                self.unused.append(number)
+                self.unused.sort()
+
+
+    def release(self) -> None:
+        """
+        Returns all unused numbers to the store.
+        """
+
+        with self.lock:
+            unused, self.unused = self.unused, []
+
+        if unused:
+            self.store.release_sequence(self.creditor_id, self.doc_type, unused)
+
+
+class SequenceAllocator:
+
+    def __init__(self, store):
+        """
+        Hands out document numbers per creditor and document type. Reservations are atomic in the store,
+        a transaction for SQLite and a lock file for json, so concurrent processes never get the same number.
+        Args:
+            store: A JsonStore or SqliteStore.
+        """
+
+        self.store = store
+
+
+    def reserve(self, creditor_id: AnyStr, doc_type: DocumentType, count: int = 1) -> Reservation:
+        """
+        Reserves a block of count numbers up front.
+        Args:
+            creditor_id (AnyStr): The creditor of the sequence.
+            doc_type (DocumentType): The document type of the sequence.
+            count (int, optional): The number of numbers to reserve. Defaults to 1.
+        Returns:
+            Reservation: The reserved numbers.
+        Example:
+            >>> with allocator.reserve("1", DocumentType.INVOICE, 3) as reservation:
+            ...     reservation.take()
+            5
+        """
+
+        return Reservation(self.store, creditor_id, doc_type, self.store.reserve_sequence(creditor_id, doc_type, count))
+
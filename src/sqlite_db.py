@@ -0,0 +1,67 @@
+import sqlite3
+import threading
+from typing import AnyStr, Callable
+
+
+class SqliteDb:
+
+    def __init__(self, path: AnyStr, row_factory: Callable = None):
+        """
+        The connections to one SQLite file, in WAL mode, so readers never wait for a writer.
+        SQLite connections cannot be shared between threads, so every thread gets its own.
+        Args:
+            path (AnyStr): Path to the SQLite file, created when it does not exist.
+            row_factory (Callable, optional): The row factory of the connections, e.g. sqlite3.Row.
+                                              Defaults to tuples.
+        Example:
+            >>> db = SqliteDb("files/db/db.sqlite")
+            >>> with db.transaction() as con:
+            ...     con.execute("DELETE FROM invoices WHERE doc_nr = ?", ("2026-12",))
+        """
+
+        self.path = path
+        self.row_factory = row_factory
+        self.local = threading.local()
+
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Returns the connection of the calling thread, opened on first use.
+        """
+
+        con = getattr(self.local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            if self.row_factory is not None:
+                con.row_factory = self.row_factory
+            self.local.con = con
+        return con
+
+
+    def transaction(self) -> "Transaction":
+        """
+        A write transaction on the connection of the calling thread, for use in a with statement.
+        """
+
+        return Transaction(self.connect())
+
+
+class Transaction:
+
+    def __init__(self, con: sqlite3.Connection):
+        self.con = con
+
+
+    def __enter__(self) -> sqlite3.Connection:
+        # take the write lock up front, so concurrent writers queue instead of deadlocking
+        self.con.execute("BEGIN IMMEDIATE")
+        return self.con
+
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.con.execute("COMMIT")
+        else:
+            self.con.execute("ROLLBACK")
@@ -0,0 +1,181 @@
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from enumerations import RoundingPolicy
+
+
+# quantities, prices and rates are exact up to this many decimals
+SCALE = 6
+UNIT = 10 ** SCALE
+
+
+@lru_cache(maxsize=4096)
+def to_fixed(value) -> int:
+    """
+    Converts a number from the json input to an integer in millionths, starting from the decimal
+    it was written as, so 0.1 is exactly 100000. Cached because quantities, prices and rates repeat a lot.
+    """
+
+    if isinstance(value, float):
+        value = repr(value)
+    return int((Decimal(value) * UNIT).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def divide(numerator: int, denominator: int) -> int:
+    """
+    Integer division rounding halves away from zero, the rounding used for all amounts.
+    """
+
+    if numerator < 0:
+        return -((-numerator * 2 + denominator) // (denominator * 2))
+    return (numerator * 2 + denominator) // (denominator * 2)
+
+
+class TotalsEngine:
+
+    def __init__(self, rounding: RoundingPolicy = RoundingPolicy.PER_LINE):
+        """
+        Computes line amounts, vat subtotals per rate and invoice totals in exact integer cents.
+        Works on columns, so the lines of many invoices are computed in one pass.
+        Every line's base amount and vat amount are rounded to cents. The rounding policy decides the
+        invoice's vat: PER_LINE adds up the rounded line vat, PER_RATE rounds the vat of each rate's
+        subtotal once, in which case the line vat is informative and may differ a cent from the total.
+        Args:
+            rounding (RoundingPolicy, optional): The vat rounding policy. Defaults to RoundingPolicy.PER_LINE.
+        """
+
+        self.rounding = rounding
+
+
+    def compute_cents(self,
+                      invoice: Sequence[int],
+                      qty: Sequence,
+                      price: Sequence,
+                      vat_pct: Sequence,
+                      count: int = None) -> List[Tuple[List[Tuple[int, int]], Dict]]:
+        """
+        Computes the amounts of a batch of invoices in cents from the columns of all their lines.
+        Args:
+            invoice (Sequence[int]): The index of the invoice of every line.
+            qty (Sequence): The quantity of every line.
+            price (Sequence): The unit price of every line.
+            vat_pct (Sequence): The vat rate of every line, e.g. 0.21.
+            count (int, optional): The number of invoices, so invoices without lines get zero totals.
+                                   Defaults to the highest invoice index + 1.
+        Returns:
+            List[Tuple[List[Tuple[int, int]], Dict]]: Per invoice, the base and vat cents of its lines in input order,
+                                                      and the base and vat cents per vat rate.
+        """
+
+        if not len(invoice) == len(qty) == len(price) == len(vat_pct):
+            raise Exception("All columns must have the same length")
+
+        if count is None:
+            count = max(invoice) + 1 if len(invoice) else 0
+
+        lines = [[] for _ in range(count)]
+        rates = [{} for _ in range(count)]
+
+        # base in cents from qty and price in millionths, vat in cents from the base and the rate in millionths;
+        # the same line recurs a lot in bulk runs, so each distinct line is computed once
+        base_unit = UNIT * UNIT // 100
+        computed = {}
+        for idx, q, p, r in zip(invoice, qty, price, vat_pct):
+            line = computed.get((q, p, r))
+            if line is None:
+                rate = to_fixed(r)
+                base_amt = divide(to_fixed(q) * to_fixed(p), base_unit)
+                line = computed[(q, p, r)] = (base_amt, divide(base_amt * rate, UNIT), rate)
+            base_amt, vat_amt, rate = line
+            lines[idx].append((base_amt, vat_amt))
+
+            subtotal = rates[idx].get(r)
+            if subtotal is None:
+                rates[idx][r] = [base_amt, vat_amt, rate]
+            else:
+                subtotal[0] += base_amt
+                subtotal[1] += vat_amt
+
+        per_rate = self.rounding == RoundingPolicy.PER_RATE
+
+        results = []
+        for idx in range(count):
+            vat_rates = {}
+            for r, (base_amt, vat_amt, rate) in rates[idx].items():
+                if per_rate:
+                    vat_amt = divide(base_amt * rate, UNIT)
+                vat_rates[r] = (base_amt, vat_amt)
+            results.append((lines[idx], vat_rates))
+
+        return results
+
+
+    def compute(self,
+                invoice: Sequence[int],
+                qty: Sequence,
+                price: Sequence,
+                vat_pct: Sequence,
+                count: int = None) -> List[Dict]:
+        """
+        Computes the totals of a batch of invoices from the columns of all their lines.
+        Takes the same columns as compute_cents.
+        Returns:
+            List[Dict]: Per invoice, the amounts of its lines in input order under 'items', the invoice
+                        totals under 'invoice_base_amt', 'invoice_vat_amt' and 'invoice_total_amt', and the
+                        base and vat amount per rate under 'vat_rates'. Amounts are floats of whole cents.
+        """
+
+        results = []
+        for lines, vat_rates in self.compute_cents(invoice, qty, price, vat_pct, count):
+            invoice_base_amt = sum(base_amt for base_amt, _ in vat_rates.values())
+            invoice_vat_amt = sum(vat_amt for _, vat_amt in vat_rates.values())
+
+            results.append({
+                "items": [
+                    {"base_amt": base_amt / 100, "vat_amt": vat_amt / 100, "total_amt": (base_amt + vat_amt) / 100}
+                    for base_amt, vat_amt in lines
+                ],
+                "invoice_base_amt": invoice_base_amt / 100,
+                "invoice_vat_amt": invoice_vat_amt / 100,
+                "invoice_total_amt": (invoice_base_amt + invoice_vat_amt) / 100,
+                "vat_rates": {r: {"base_amt": base_amt / 100, "vat_amt": vat_amt / 100} for r, (base_amt, vat_amt) in vat_rates.items()}
+            })
+
+        return results
+
+
+    def columns(self, invoices: Iterable[Iterable[Dict]]) -> Tuple[List, List, List, List, int]:
+        """
+        Turns many invoices given as lists of lines with 'qty', 'price' and 'vat_pct' into the columns of compute.
+        """
+
+        invoice, qty, price, vat_pct = [], [], [], []
+        count = 0
+        for idx, items in enumerate(invoices):
+            count = idx + 1
+            for item in items:
+                invoice.append(idx)
+                qty.append(item["qty"])
+                price.append(item["price"])
+                vat_pct.append(item["vat_pct"])
+
+        return invoice, qty, price, vat_pct, count
+
+
+    def compute_many(self, invoices: Iterable[Iterable[Dict]]) -> List[Dict]:
+        """
+        Computes the totals of many invoices given as lists of lines with 'qty', 'price' and 'vat_pct'.
+        Returns:
+            List[Dict]: The totals per invoice, as returned by compute.
+        """
+
+        return self.compute(*self.columns(invoices))
+
+
+    def invoice_totals(self, items: Iterable[Dict]) -> Dict:
+        """
+        Computes the totals of one invoice given as a list of lines with 'qty', 'price' and 'vat_pct'.
+        """
+
+        return self.compute_many([items])[0]
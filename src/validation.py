@@ -0,0 +1,194 @@
+import re
+import threading
+from typing import Callable, Dict, Iterable, List
+
+from enumerations import DocumentType, InvoiceTemplate
+
+
+DATE = re.compile(r"\d{2}-\d{2}-\d{4}$")
+
+# the company fields the renderers print, for the debtor in the header and the creditor in the footer
+DEBTOR_FIELDS = ("name", "street", "nr", "zip", "city", "country")
+CREDITOR_FIELDS = ("name", "street", "nr", "zip", "city", "country", "rpr", "vat", "bank_account", "phone", "email")
+
+
+class ValidationError(Exception):
+
+    def __init__(self, errors: Dict[int, List[str]]):
+        """
+        Raised when input data is invalid, before any document is built.
+        Args:
+            errors (Dict[int, List[str]]): Every error per input, by the index of the input.
+        """
+
+        self.errors = errors
+        lines = [f"input {idx}: {error}" for idx, messages in errors.items() for error in messages]
+        super().__init__(f"{len(errors)} invalid input(s):\n" + "\n".join(lines))
+
+
+def is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def required(field: str, check: Callable, expected: str) -> Callable:
+    def validate(data: Dict, db: Dict, errors: List[str]) -> None:
+        if field not in data:
+            errors.append(f"Missing field: {field}")
+        elif not check(data[field]):
+            errors.append(f"Invalid field: {field} must be {expected}")
+    return validate
+
+
+def optional(field: str, check: Callable, expected: str) -> Callable:
+    def validate(data: Dict, db: Dict, errors: List[str]) -> None:
+        if field in data and not check(data[field]):
+            errors.append(f"Invalid field: {field} must be {expected}")
+    return validate
+
+
+def company(field: str, is_required: bool, fields: Iterable[str] = (), default: str = None) -> Callable:
+    def validate(data: Dict, db: Dict, errors: List[str]) -> None:
+        if field in data:
+            company_id = data[field]
+        elif default is not None:
+            company_id = db["defaults"][default]
+        else:
+            if is_required:
+                errors.append(f"Missing field: {field}")
+            return
+
+        if company_id not in db["companies"]:
+            errors.append(f"Unknown company: {field} {company_id}")
+            return
+
+        missing = [key for key in fields if db["companies"][company_id].get(key) is None]
+        if missing:
+            errors.append(f"Incomplete company: {field} {company_id} has no {', '.join(missing)}")
+    return validate
+
+
+def items(data: Dict, db: Dict, errors: List[str]) -> None:
+    if "items" not in data:
+        errors.append("Missing field: items")
+        return
+    if not isinstance(data["items"], dict):
+        errors.append("Invalid field: items must be an object of items by key")
+        return
+
+    for key, item in data["items"].items():
+        if not isinstance(item, dict):
+            errors.append(f"Invalid item {key}: must be an object")
+            continue
+        if not isinstance(item.get("description"), str):
+            errors.append(f"Invalid item {key}: {'missing' if 'description' not in item else 'invalid'} description")
+        for field in ["qty", "price", "vat_pct"]:
+            if field not in item:
+                errors.append(f"Invalid item {key}: missing {field}")
+            elif not is_number(item[field]):
+                errors.append(f"Invalid item {key}: {field} must be a number")
+        if is_number(item.get("vat_pct")) and not 0 <= item["vat_pct"] < 1:
+            errors.append(f"Invalid item {key}: vat_pct must be a fraction, e.g. 0.21")
+
+
+def is_date(value) -> bool:
+    return isinstance(value, str) and DATE.match(value) is not None
+
+
+def is_rate(value) -> bool:
+    return is_number(value) and 0 <= value < 1
+
+
+INVOICE_CHECKS = [
+    company("debtor_id", True, DEBTOR_FIELDS),
+    company("creditor_id", False, CREDITOR_FIELDS, default="creditor_id"),
+    optional("invoice_date", is_date, "a date as dd-mm-yyyy"),
+    optional("delivery_date", is_date, "a date as dd-mm-yyyy"),
+    optional("due_date", is_date, "a date as dd-mm-yyyy"),
+    optional("payment_date", is_date, "a date as dd-mm-yyyy"),
+    optional("period", lambda value: isinstance(value, str), "text"),
+]
+
+TEMPLATE_CHECKS = {
+    InvoiceTemplate.NEON: [
+        items,
+    ],
+    InvoiceTemplate.ARGENTA: [
+        required("consultancy_days", is_number, "a number"),
+        optional("day_rate", is_number, "a number"),
+        optional("vat_pct", is_rate, "a fraction, e.g. 0.21"),
+    ],
+}
+
+
+class Validator:
+
+    def __init__(self, checks: List[Callable]):
+        """
+        Validates input data against a fixed list of checks. Every check runs, so all errors of a document
+        are reported at once instead of only the first one.
+        Args:
+            checks (List[Callable]): Functions taking the data, the db and the list to append errors to.
+        """
+
+        self.checks = checks
+
+
+    def validate(self, data: Dict, db: Dict) -> List[str]:
+        """
+        Returns every error of one input, or an empty list when it is valid.
+        """
+
+        if not isinstance(data, dict):
+            return ["Invalid input: must be an object"]
+
+        errors = []
+        for check in self.checks:
+            check(data, db, errors)
+        return errors
+
+
+    def validate_batch(self, inputs: Iterable[Dict], db: Dict) -> Dict[int, List[str]]:
+        """
+        Validates a batch of inputs in one pass.
+        Returns:
+            Dict[int, List[str]]: The errors by index of the input, only for invalid inputs.
+        """
+
+        errors = {}
+        for idx, data in enumerate(inputs):
+            messages = self.validate(data, db)
+            if messages:
+                errors[idx] = messages
+        return errors
+
+
+    def check_batch(self, inputs: Iterable[Dict], db: Dict) -> None:
+        """
+        Validates a batch of inputs in one pass.
+        Raises:
+            ValidationError: With the errors of every invalid input.
+        """
+
+        errors = self.validate_batch(inputs, db)
+        if errors:
+            raise ValidationError(errors)
+
+
+_validators = {}
+_validators_lock = threading.Lock()
+
+
+def validator(doc_type: DocumentType, invoice_type: InvoiceTemplate = InvoiceTemplate.NEON) -> Validator:
+    """
+    The validator of a document type and template, compiled on first use.
+    """
+
+    key = (doc_type, invoice_type)
+    if key not in _validators:
+        if doc_type == DocumentType.INVOICE:
+            checks = INVOICE_CHECKS + TEMPLATE_CHECKS[invoice_type]
+        else:
+            checks = []
+        with _validators_lock:
+            _validators.setdefault(key, Validator(checks))
+    return _validators[key]
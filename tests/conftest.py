@@ -0,0 +1,21 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# the modules in src import each other by name, as when the app is run from there
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """
+    A copy of the example db in a temporary directory.
+    """
+
+    path = tmp_path / "db.json"
+    shutil.copy(os.path.join(ROOT, "files", "db", "db.example.json"), path)
+    return str(path)
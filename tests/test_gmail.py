@@ -0,0 +1,58 @@
+import importlib
+import json
+
+import httplib2
+import pytest
+from googleapiclient.http import BatchHttpRequest
+
+CONFIG_KEYS = ("PATH_DB", "PATH_OUT", "PATH_CONFIG", "CLIENT_ID", "CLIENT_TOKEN", "GTOKEN_FILE_NAME",
+               "DIR_ID_ARGENTA", "FROM_ADDRESS", "TO_ADDRESS_TEST")
+
+
+@pytest.fixture
+def gmail(tmp_path, monkeypatch):
+    # Config reads the .env of the working directory when it is first imported
+    (tmp_path / ".env").write_text("".join(f"{key}=x\n" for key in CONFIG_KEYS))
+    monkeypatch.chdir(tmp_path)
+    gmail_module = importlib.import_module("gmail")
+
+    token_file = tmp_path / "token.json"
+    token_file.write_text(json.dumps({
+        "token": "token", "refresh_token": "refresh", "token_uri": "https://oauth2.googleapis.com/token",
+        "client_id": "id", "client_secret": "secret", "expiry": "2099-01-01T00:00:00Z",
+    }))
+    return gmail_module.Gmail("secret.json", str(token_file))
+
+
+def test_results_of_sent_batches_survive_a_dropped_connection(gmail, monkeypatch):
+    batches = []
+
+    def execute(batch, http=None):
+        batches.append(list(batch._order))
+        if len(batches) == 2:
+            raise OSError("connection reset")
+        for request_id in batch._order:
+            batch._callback(request_id, {"id": f"sent-{request_id}"}, None)
+
+    monkeypatch.setattr(BatchHttpRequest, "execute", execute)
+
+    results = gmail.send_drafts(["a", "b", "c", "d", "e"], batch_size=2)
+
+    assert [result["result"] for result in results[:2]] == [{"id": "sent-0"}, {"id": "sent-1"}]
+    assert all(isinstance(result["error"], OSError) for result in results[2:4])
+    assert results[4] == {"result": {"id": "sent-4"}, "error": None}
+    # the failed batch is not sent again, its messages may have gone out
+    assert batches == [["0", "1"], ["2", "3"], ["4"]]
+
+
+def test_a_failed_token_refresh_fails_the_batch(gmail, monkeypatch):
+    from google.auth.exceptions import TransportError
+
+    def execute(batch, http=None):
+        raise TransportError("refresh failed")
+
+    monkeypatch.setattr(BatchHttpRequest, "execute", execute)
+
+    results = gmail.send_drafts(["a"])
+
+    assert results[0]["result"] is None and isinstance(results[0]["error"], TransportError)
@@ -0,0 +1,44 @@
+import pytest
+
+from enumerations import DocumentType
+from invoice_store import JsonStore, SqliteStore
+
+
+def test_torn_last_line_is_skipped_and_dropped(db_path):
+    store = JsonStore(db_path)
+    store.commit_invoice(DocumentType.INVOICE, {"doc_nr": "2026-1", "creditor_id": "1"})
+
+    # a crash during the next append left half a line
+    with open(store.journal_path, "a") as f:
+        f.write('{"creditor_id": "1", "doc_nr": "2026-')
+
+    assert [record["doc_nr"] for record in store.invoices()] == ["2026-1"]
+    assert store.get_invoice("1", DocumentType.INVOICE, "2026-1") is not None
+
+    store.commit_invoice(DocumentType.INVOICE, {"doc_nr": "2026-2", "creditor_id": "1"})
+
+    assert [record["doc_nr"] for record in store.find_invoices("1")] == ["2026-1", "2026-2"]
+    with open(store.journal_path, "r") as f:
+        assert len(f.readlines()) == 2
+
+
+def test_torn_last_line_does_not_break_the_sqlite_import(db_path):
+    store = JsonStore(db_path)
+    store.commit_invoice(DocumentType.INVOICE, {"doc_nr": "2026-1", "creditor_id": "1", "issued_at": "x"})
+    with open(store.journal_path, "a") as f:
+        f.write('{"creditor_id"')
+
+    sqlite_store = SqliteStore(db_path.replace(".json", ".sqlite"))
+
+    assert sqlite_store.get_invoice("1", DocumentType.INVOICE, "2026-1") is not None
+
+
+def test_corrupt_line_before_the_last_raises(db_path):
+    store = JsonStore(db_path)
+    store.commit_invoice(DocumentType.INVOICE, {"doc_nr": "2026-1", "creditor_id": "1"})
+    with open(store.journal_path, "a") as f:
+        f.write('{"creditor_id": \n')
+        f.write('{"creditor_id": "1", "doc_nr": "2026-3", "doc_type": "INVOICE"}\n')
+
+    with pytest.raises(Exception, match="corrupt at line 2"):
+        store.find_invoices()
@@ -0,0 +1,61 @@
+import json
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from ratelimit import RateLimiter, is_rate_limited
+
+
+def http_error(status: int, error: dict) -> HttpError:
+    return HttpError(httplib2.Response({"status": status}), json.dumps({"error": dict(error, code=status)}).encode())
+
+
+LEGACY_QUOTA = http_error(403, {
+    "message": "User Rate Limit Exceeded",
+    "errors": [{"domain": "usageLimits", "reason": "userRateLimitExceeded", "message": "User Rate Limit Exceeded"}],
+})
+
+ERROR_INFO_QUOTA = http_error(403, {
+    "message": "Quota exceeded for quota metric 'Queries'",
+    "status": "PERMISSION_DENIED",
+    "errors": [{"domain": "global", "reason": "forbidden", "message": "Quota exceeded"}],
+    "details": [{
+        "@type": "type.googleapis.com/google.rpc.ErrorInfo",
+        "reason": "RATE_LIMIT_EXCEEDED",
+        "domain": "googleapis.com",
+        "metadata": {"quota_metric": "drive.googleapis.com/default", "service": "drive.googleapis.com"},
+    }],
+})
+
+ACCESS_DENIED = http_error(403, {
+    "message": "The user does not have sufficient permissions for this file.",
+    "errors": [{"domain": "global", "reason": "insufficientFilePermissions", "message": "Forbidden"}],
+})
+
+
+def test_legacy_quota_reason_is_rate_limited():
+    assert is_rate_limited(LEGACY_QUOTA)
+
+
+def test_error_info_quota_reason_is_rate_limited():
+    assert is_rate_limited(ERROR_INFO_QUOTA)
+
+
+def test_access_denied_is_not_rate_limited():
+    assert not is_rate_limited(ACCESS_DENIED)
+
+
+def test_quota_errors_are_retried_even_when_not_idempotent():
+    limiter = RateLimiter(10)
+
+    assert limiter.retry_delay(LEGACY_QUOTA, 0, idempotent=False) is not None
+    assert limiter.retry_delay(ERROR_INFO_QUOTA, 0, idempotent=False) is not None
+    assert limiter.retry_delay(ACCESS_DENIED, 0) is None
+
+
+def test_server_errors_are_retried_only_when_idempotent():
+    limiter = RateLimiter(10)
+    error = http_error(503, {"message": "Backend Error"})
+
+    assert limiter.retry_delay(error, 0) is not None
+    assert limiter.retry_delay(error, 0, idempotent=False) is None
@@ -0,0 +1,67 @@
+import json
+import sqlite3
+
+import pytest
+
+from enumerations import DocumentType
+from invoice_store import JsonStore, SqliteStore, release_numbers
+from sequences import SequenceAllocator
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def store(request, db_path):
+    if request.param == "json":
+        return JsonStore(db_path)
+    return SqliteStore(db_path.replace(".json", ".sqlite"))
+
+
+def test_release_numbers_voids_the_middle_and_lowers_the_end():
+    assert release_numbers(10, [], [7, 9, 10]) == (8, [7])
+    assert release_numbers(8, [7], [8]) == (6, [])
+
+
+def test_number_given_back_from_the_middle_is_voided(store):
+    allocator = SequenceAllocator(store)
+    # the example db starts the invoices of creditor 1 at 1
+    with allocator.reserve("1", DocumentType.INVOICE, 3) as reservation:
+        numbers = [reservation.take() for _ in range(3)]
+        reservation.give_back(numbers[1])
+
+    assert numbers == [2, 3, 4]
+    assert store.last_sequence("1", DocumentType.INVOICE) == 4
+
+    # a later invoice never gets a number below one issued before it
+    with allocator.reserve("1", DocumentType.INVOICE) as reservation:
+        assert reservation.take() == 5
+
+
+def test_numbers_at_the_end_are_handed_out_again(store):
+    allocator = SequenceAllocator(store)
+    with allocator.reserve("1", DocumentType.INVOICE, 3) as reservation:
+        first, second = reservation.take(), reservation.take()
+        reservation.give_back(second)
+
+    assert store.last_sequence("1", DocumentType.INVOICE) == first
+
+    with allocator.reserve("1", DocumentType.INVOICE) as reservation:
+        assert reservation.take() == second
+
+
+def test_released_numbers_of_older_versions_are_voided(db_path):
+    sqlite_path = db_path.replace(".json", ".sqlite")
+    con = sqlite3.connect(sqlite_path)
+    con.executescript(
+        "CREATE TABLE sequences (creditor_id TEXT NOT NULL, seq_id TEXT NOT NULL, last_seq INTEGER NOT NULL,"
+        " PRIMARY KEY (creditor_id, seq_id));"
+        "INSERT INTO sequences VALUES ('1', 'invoice', 9);"
+        "CREATE TABLE released_sequences (creditor_id TEXT NOT NULL, seq_id TEXT NOT NULL, seq INTEGER NOT NULL,"
+        " PRIMARY KEY (creditor_id, seq_id, seq));"
+        "INSERT INTO released_sequences VALUES ('1', 'invoice', 4);"
+    )
+    con.close()
+
+    with open(db_path.replace(".json", ".sequences.json"), "w") as f:
+        json.dump({"last_sequences": {"1": {"invoice": 9}}, "released_sequences": {"1": {"invoice": [4]}}}, f)
+
+    for store in (SqliteStore(sqlite_path), JsonStore(db_path)):
+        assert SequenceAllocator(store).reserve("1", DocumentType.INVOICE).take() == 10